@@ -0,0 +1,142 @@
+"""
+合成数据生成器：按 站点数 × 污染物数 × 年数 生成与真实数据同格式的 CSV 与 GeoTIFF。
+
+- CSV 与 database/test/beijing_NO2_20240924.csv 同格式：data,hour,type,<站点名...>，每个污染物每天一个文件；
+- GeoTIFF 与 database/test/NO2/2024_09_24/*.tif 同网格、同目录结构：<污染物>/<YYYY_MM_DD>/<HH>.tif；
+- 固定随机种子，同样的参数总是得到同样的数据，便于跨版本对比。
+"""
+import os
+import csv
+import json
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+# ================= 配置部分 =================
+POLLUTANT_NAMES = ['NO2', 'SO2', 'O3', 'CO', 'PM25', 'PM10']
+
+# 与样例 TIF 相同的网格：0.01° 分辨率，覆盖北京市
+RASTER_WIDTH = 138
+RASTER_HEIGHT = 78
+RASTER_TRANSFORM = from_origin(115.74682666500023, 40.21896425000006, 0.01, 0.01)
+
+# 站点值的缺测比例
+MISSING_RATIO = 0.02
+
+
+# ===========================================
+
+def site_layout(n_sites, rng):
+    """在栅格范围内随机布设站点，返回 [{'site_name', 'longitude', 'latitude'}]。"""
+    west, north = RASTER_TRANSFORM.c, RASTER_TRANSFORM.f
+    east = west + RASTER_WIDTH * RASTER_TRANSFORM.a
+    south = north + RASTER_HEIGHT * RASTER_TRANSFORM.e
+    longitudes = rng.uniform(west + 0.05, east - 0.05, n_sites)
+    latitudes = rng.uniform(south + 0.05, north - 0.05, n_sites)
+    return [
+        {'site_name': f"合成站点{i + 1:04d}", 'longitude': round(float(lon), 5), 'latitude': round(float(lat), 5)}
+        for i, (lon, lat) in enumerate(zip(longitudes, latitudes))
+    ]
+
+
+def hourly_values(n_days, n_sites, rng, base=40.0):
+    """生成 [天, 小时, 站点] 的浓度：日变化正弦 + 站点偏置 + 噪声。"""
+    hours = np.arange(24)
+    diurnal = 15.0 * np.sin((hours - 8) / 24 * 2 * np.pi)
+    site_bias = rng.normal(0, 8, n_sites)
+    noise = rng.normal(0, 6, (n_days, 24, n_sites))
+    values = base + diurnal[None, :, None] + site_bias[None, None, :] + noise
+    return np.clip(values, 0, None).round(1)
+
+
+def write_csvs(csv_dir, days, sites, pollutant, values, rng):
+    os.makedirs(csv_dir, exist_ok=True)
+    missing = rng.random(values.shape) < MISSING_RATIO
+    header = ['data', 'hour', 'type'] + [site['site_name'] for site in sites]
+    for d, day in enumerate(days):
+        path = os.path.join(csv_dir, f"synthetic_{pollutant}_{day.strftime('%Y%m%d')}.csv")
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for hour in range(24):
+                row = ['' if missing[d, hour, s] else values[d, hour, s] for s in range(len(sites))]
+                writer.writerow([day.isoformat(), hour, pollutant] + row)
+    return len(days)
+
+
+def write_tifs(tif_dir, days, pollutant, rng):
+    """每小时一个单波段 float32 栅格，空间上是平滑的高斯斑块叠加噪声。"""
+    rows, cols = np.mgrid[0:RASTER_HEIGHT, 0:RASTER_WIDTH]
+    profile = {
+        'driver': 'GTiff', 'dtype': 'float32', 'nodata': float('nan'),
+        'width': RASTER_WIDTH, 'height': RASTER_HEIGHT, 'count': 1,
+        'crs': 'EPSG:4326', 'transform': RASTER_TRANSFORM,
+    }
+    count = 0
+    for day in days:
+        day_dir = os.path.join(tif_dir, pollutant, day.strftime('%Y_%m_%d'))
+        os.makedirs(day_dir, exist_ok=True)
+        for hour in range(24):
+            cy, cx = rng.uniform(0, RASTER_HEIGHT), rng.uniform(0, RASTER_WIDTH)
+            plume = 40.0 * np.exp(-((rows - cy) ** 2 + (cols - cx) ** 2) / 800.0)
+            grid = (25.0 + plume + rng.normal(0, 3, plume.shape)).astype('float32')
+            with rasterio.open(os.path.join(day_dir, f"{hour:02d}.tif"), 'w', **profile) as dst:
+                dst.write(grid, 1)
+            count += 1
+    return count
+
+
+def generate(out_dir, n_sites=35, n_pollutants=1, years=0.1, start=date(2024, 1, 1), tif_days=None, seed=20240924):
+    """生成一整套合成数据并写出 manifest.json，返回 manifest。"""
+    rng = np.random.default_rng(seed)
+    n_days = max(1, int(round(years * 365)))
+    days = [start + timedelta(days=i) for i in range(n_days)]
+    tif_days = days if tif_days is None else days[:tif_days]
+    sites = site_layout(n_sites, rng)
+    pollutants = POLLUTANT_NAMES[:n_pollutants]
+
+    csv_dir = os.path.join(out_dir, 'csv')
+    tif_dir = os.path.join(out_dir, 'tif')
+    csv_files = tif_files = 0
+    for pollutant in pollutants:
+        csv_files += write_csvs(csv_dir, days, sites, pollutant, hourly_values(n_days, n_sites, rng), rng)
+        tif_files += write_tifs(tif_dir, tif_days, pollutant, rng)
+
+    manifest = {
+        'seed': seed,
+        'sites': sites,
+        'pollutants': pollutants,
+        'start_date': days[0].isoformat(),
+        'end_date': days[-1].isoformat(),
+        'days': n_days,
+        'csv_dir': csv_dir,
+        'csv_files': csv_files,
+        'tif_dir': tif_dir,
+        'tif_files': tif_files,
+        'station_rows': int(n_days * 24 * n_sites * len(pollutants)),
+    }
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成 CSV / GeoTIFF 基准数据")
+    parser.add_argument('out_dir')
+    parser.add_argument('--sites', type=int, default=35)
+    parser.add_argument('--pollutants', type=int, default=1, choices=range(1, len(POLLUTANT_NAMES) + 1))
+    parser.add_argument('--years', type=float, default=0.1)
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2024, 1, 1))
+    parser.add_argument('--tif-days', type=int, default=None, help="只为前 N 天生成栅格，默认全部")
+    parser.add_argument('--seed', type=int, default=20240924)
+    args = parser.parse_args()
+
+    manifest = generate(args.out_dir, args.sites, args.pollutants, args.years, args.start, args.tif_days, args.seed)
+    print(f"✅ 生成 {manifest['csv_files']} 个 CSV（约 {manifest['station_rows']} 行站点数据）"
+          f"和 {manifest['tif_files']} 个 GeoTIFF -> {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ CREATE TABLE measurements (
     date          DATE NOT NULL,
     hour          INT NOT NULL CHECK (hour >= 0 AND hour <= 23),
     value         DOUBLE PRECISION,
+    is_filled     BOOLEAN NOT NULL DEFAULT FALSE,
 
     -- 外键约束
     FOREIGN KEY (site_id) REFERENCES sites(site_id),
@@ -37,6 +38,7 @@ COMMENT ON COLUMN measurements.pollutant_id IS '污染物类型引用ID';
 COMMENT ON COLUMN measurements.date IS '采样日期';
 COMMENT ON COLUMN measurements.hour IS '采样小时(0-23)';
 COMMENT ON COLUMN measurements.value IS '监测浓度数值';
+COMMENT ON COLUMN measurements.is_filled IS '是否为缺测插补值（tools/fillGaps.py 写入）';
 
 COMMENT ON TABLE pollutants IS '污染物类型表';
 COMMENT ON COLUMN pollutants.pollutant_name IS '污染物名称';
@@ -48,6 +50,7 @@ CREATE TABLE measurements_tif (
     hour          INT NOT NULL CHECK (hour >= 0 AND hour <= 23),
     value         DOUBLE PRECISION,
     data_dir      VARCHAR(80) NOT NULL,
+    is_filled     BOOLEAN NOT NULL DEFAULT FALSE,
 
     -- 外键约束
     FOREIGN KEY (site_id) REFERENCES sites(site_id),
@@ -63,6 +66,261 @@ COMMENT ON COLUMN measurements_tif.date IS '采样日期';
 COMMENT ON COLUMN measurements_tif.hour IS '采样小时(0-23)';
 COMMENT ON COLUMN measurements_tif.value IS '监测浓度数值';
 COMMENT ON COLUMN measurements_tif.data_dir IS 'tif数据存放路径';
+COMMENT ON COLUMN measurements_tif.is_filled IS '是否为缺测栅格插补值（tools/fillGaps.py 写入）';
+CREATE TABLE calibration_coefficients (
+    pollutant_id  INT NOT NULL,
+    site_id       INT NOT NULL DEFAULT 0,
+    n_pairs       BIGINT NOT NULL DEFAULT 0,
+    sum_x         DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_y         DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_xx        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_xy        DOUBLE PRECISION NOT NULL DEFAULT 0,
+    slope         DOUBLE PRECISION NOT NULL DEFAULT 1,
+    intercept     DOUBLE PRECISION NOT NULL DEFAULT 0,
+    fit_version   INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (pollutant_id) REFERENCES pollutants(pollutant_id),
+    PRIMARY KEY (pollutant_id, site_id)
+);
+COMMENT ON TABLE calibration_coefficients IS 'TIF 对站点的线性校正系数：station ≈ slope * tif + intercept';
+COMMENT ON COLUMN calibration_coefficients.site_id IS '监测站点引用ID，0 表示全区域统一系数';
+COMMENT ON COLUMN calibration_coefficients.n_pairs IS '参与拟合的站点/TIF 配对小时数';
+COMMENT ON COLUMN calibration_coefficients.sum_x IS '充分统计量：Σtif，用于增量重新拟合';
+COMMENT ON COLUMN calibration_coefficients.fit_version IS '拟合版本号，每次重新拟合递增';
+
+CREATE TABLE calibration_pairs (
+    site_id       INT NOT NULL,
+    pollutant_id  INT NOT NULL,
+    date          DATE NOT NULL,
+    hour          INT NOT NULL CHECK (hour >= 0 AND hour <= 23),
+
+    PRIMARY KEY (site_id, pollutant_id, date, hour)
+);
+COMMENT ON TABLE calibration_pairs IS '已累加进校正系数的配对小时，保证增量拟合不重复计数';
+
+CREATE TABLE calibration_state (
+    pollutant_id   INT PRIMARY KEY,
+    paired_through DATE NOT NULL,
+
+    FOREIGN KEY (pollutant_id) REFERENCES pollutants(pollutant_id)
+);
+COMMENT ON TABLE calibration_state IS '增量拟合的高水位：calibrateTif.py 只扫描 paired_through 往前回看若干天之后的 TIF 小时';
+COMMENT ON COLUMN calibration_state.paired_through IS '已配对的最新日期';
+-- 增量拟合按 污染物 + 日期下限 扫描 measurements_tif，站点表一侧走 unique_record 逐行查找
+CREATE INDEX measurements_tif_pollutant_date ON measurements_tif (pollutant_id, date);
+
+CREATE TABLE fill_state (
+    source         VARCHAR(10) NOT NULL CHECK (source IN ('station', 'tif')),
+    pollutant_id   INT NOT NULL,
+    filled_through DATE NOT NULL,
+
+    PRIMARY KEY (source, pollutant_id),
+    FOREIGN KEY (pollutant_id) REFERENCES pollutants(pollutant_id)
+);
+COMMENT ON TABLE fill_state IS '增量插补的高水位：fillGaps.py 只处理 filled_through 往前回看若干天之后的缺口';
+COMMENT ON COLUMN fill_state.filled_through IS '已处理的最新日期（站点为最新实测日期，tif 为最新栅格日期）';
+
+CREATE TABLE measurements_tif_corrected (
+    distinct_id   VARCHAR(50) PRIMARY KEY,
+    site_id       INT NOT NULL,
+    pollutant_id  INT NOT NULL,
+    date          DATE NOT NULL,
+    hour          INT NOT NULL CHECK (hour >= 0 AND hour <= 23),
+    value         DOUBLE PRECISION,
+    raw_value     DOUBLE PRECISION,
+    coefficient_site_id INT NOT NULL,
+    fit_version   INT NOT NULL,
+
+    FOREIGN KEY (site_id) REFERENCES sites(site_id),
+    FOREIGN KEY (pollutant_id) REFERENCES pollutants(pollutant_id),
+    CONSTRAINT unique_record3 UNIQUE (site_id, pollutant_id, date, hour)
+);
+COMMENT ON TABLE measurements_tif_corrected IS '经站点校正后的 TIF 监测数据表';
+COMMENT ON COLUMN measurements_tif_corrected.value IS '校正后的浓度数值';
+COMMENT ON COLUMN measurements_tif_corrected.raw_value IS '校正前的 TIF 原始数值';
+COMMENT ON COLUMN measurements_tif_corrected.coefficient_site_id IS '所用系数对应的站点ID，0 表示区域系数';
+COMMENT ON COLUMN measurements_tif_corrected.fit_version IS '所用系数的拟合版本号';
+
+CREATE TABLE data_versions (
+    site_id       INT NOT NULL,
+    pollutant_id  INT NOT NULL,
+    date          DATE NOT NULL,
+    revision      BIGINT NOT NULL DEFAULT 1,
+
+    PRIMARY KEY (site_id, pollutant_id, date)
+);
+COMMENT ON TABLE data_versions IS '每个 站点/污染物/日期 的写入次数，由导入触发器维护，后端据此生成 HTTP ETag';
+COMMENT ON COLUMN data_versions.revision IS '该天每有一条导入语句写入新行（站点或 TIF）就加 1，只增不减';
+-- 每次导入提交后，按 污染物/日期 汇总本条语句新增的小时并 NOTIFY，供后端 /api/stream 推送增量；
+-- 同时为涉及的 站点/污染物/日期 递增 data_versions.revision，区间内任何一天有新数据，ETag 就会变化。
+-- 语句级触发器 + 过渡表：批量插入只触发一次；ON CONFLICT 跳过的行不会出现在 new_rows 中。
+-- 导入时实测值覆盖 fillGaps 插补值走的是 ON CONFLICT DO UPDATE，由同一函数的 UPDATE 触发器处理。
+-- 通知只带污染物、日期与该天写入的小时（最多 24 个）：NOTIFY 负载上限 8000 字节，站点列表随站点数增长会让整次导入失败；
+-- 按站点过滤由后端订阅方完成。跨很多天的批量导入按天分成多条通知，后端只重新读取这些天里真正写入的小时，
+-- 不会把首尾之间的整段窗口推给客户端。
+CREATE OR REPLACE FUNCTION notify_measurements_ingested() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO data_versions (site_id, pollutant_id, date)
+    SELECT DISTINCT site_id, pollutant_id, date FROM new_rows
+    ORDER BY site_id, pollutant_id, date
+    ON CONFLICT (site_id, pollutant_id, date) DO UPDATE SET revision = data_versions.revision + 1;
+
+    PERFORM pg_notify('measurements_ingested', json_build_object(
+        'source', TG_ARGV[0],
+        'pollutant_id', batch.pollutant_id,
+        'date', batch.date,
+        'hours', batch.hours
+    )::text)
+    FROM (
+        SELECT pollutant_id, date, array_agg(DISTINCT hour ORDER BY hour) AS hours
+        FROM new_rows
+        GROUP BY pollutant_id, date
+        ORDER BY pollutant_id, date
+    ) batch;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER measurements_ingested
+    AFTER INSERT ON measurements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_measurements_ingested('station');
+
+CREATE TRIGGER measurements_tif_ingested
+    AFTER INSERT ON measurements_tif
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_measurements_ingested('tif');
+
+CREATE TRIGGER measurements_updated
+    AFTER UPDATE ON measurements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_measurements_ingested('station');
+
+CREATE TRIGGER measurements_tif_updated
+    AFTER UPDATE ON measurements_tif
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_measurements_ingested('tif');
+
+CREATE TABLE climatology (
+    source        VARCHAR(10) NOT NULL,
+    site_id       INT NOT NULL,
+    pollutant_id  INT NOT NULL,
+    year          INT NOT NULL,
+    dimension     VARCHAR(10) NOT NULL,
+    bucket        INT NOT NULL,
+    value_sum     DOUBLE PRECISION NOT NULL,
+    value_sq_sum  DOUBLE PRECISION NOT NULL,
+    value_count   BIGINT NOT NULL,
+
+    PRIMARY KEY (source, pollutant_id, dimension, site_id, year, bucket),
+    CHECK (dimension IN ('hour', 'weekday', 'month'))
+);
+COMMENT ON TABLE climatology IS '按 小时/星期/月份 汇总的逐年累计量，由导入触发器增量维护，供后端 /api/profiles 使用';
+COMMENT ON COLUMN climatology.source IS 'station（measurements）或 tif（measurements_tif）';
+COMMENT ON COLUMN climatology.bucket IS 'hour: 0-23；weekday: 1-7（ISO，1 为周一）；month: 1-12';
+COMMENT ON COLUMN climatology.value_sq_sum IS '值的平方和，用于计算标准差';
+-- 只累计实测值：插补行（is_filled）与空值不计入。按主键顺序写入，并发导入更新同一批行时不会死锁。
+-- UPDATE（实测值覆盖插补值等）时先减去旧行中已计入的部分、再加上新行，两种情况共用同一条累加语句；
+-- 过渡表在 EXECUTE 的动态 SQL 中同样可见。
+CREATE OR REPLACE FUNCTION accumulate_climatology() RETURNS trigger AS $$
+DECLARE
+    delta TEXT := 'SELECT site_id, pollutant_id, date, hour, value, 1 AS sign FROM new_rows
+                   WHERE value IS NOT NULL AND NOT is_filled';
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        delta := delta || ' UNION ALL SELECT site_id, pollutant_id, date, hour, value, -1 FROM old_rows
+                            WHERE value IS NOT NULL AND NOT is_filled';
+    END IF;
+
+    EXECUTE format($sql$
+        INSERT INTO climatology (source, site_id, pollutant_id, year, dimension, bucket,
+                                 value_sum, value_sq_sum, value_count)
+        SELECT $1, r.site_id, r.pollutant_id, EXTRACT(YEAR FROM r.date)::int, b.dimension, b.bucket,
+               SUM(r.sign * r.value), SUM(r.sign * r.value * r.value), SUM(r.sign)
+        FROM (%s) r
+        CROSS JOIN LATERAL (VALUES
+            ('hour', r.hour),
+            ('weekday', EXTRACT(ISODOW FROM r.date)::int),
+            ('month', EXTRACT(MONTH FROM r.date)::int)
+        ) AS b(dimension, bucket)
+        GROUP BY r.pollutant_id, b.dimension, r.site_id, 4, b.bucket
+        ORDER BY r.pollutant_id, b.dimension, r.site_id, 4, b.bucket
+        ON CONFLICT (source, pollutant_id, dimension, site_id, year, bucket) DO UPDATE SET
+            value_sum = climatology.value_sum + EXCLUDED.value_sum,
+            value_sq_sum = climatology.value_sq_sum + EXCLUDED.value_sq_sum,
+            value_count = climatology.value_count + EXCLUDED.value_count
+    $sql$, delta) USING TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER measurements_climatology
+    AFTER INSERT ON measurements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION accumulate_climatology('station');
+
+CREATE TRIGGER measurements_tif_climatology
+    AFTER INSERT ON measurements_tif
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION accumulate_climatology('tif');
+
+CREATE TRIGGER measurements_climatology_update
+    AFTER UPDATE ON measurements
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION accumulate_climatology('station');
+
+CREATE TRIGGER measurements_tif_climatology_update
+    AFTER UPDATE ON measurements_tif
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION accumulate_climatology('tif');
+
+-- 从两张明细表全量重算 climatology（建表后回填历史数据，或手工修改过明细数据时执行）：SELECT refresh_climatology();
+CREATE OR REPLACE FUNCTION refresh_climatology() RETURNS void AS $$
+BEGIN
+    LOCK TABLE climatology IN EXCLUSIVE MODE;
+    DELETE FROM climatology;
+    INSERT INTO climatology (source, site_id, pollutant_id, year, dimension, bucket,
+                             value_sum, value_sq_sum, value_count)
+    SELECT r.source, r.site_id, r.pollutant_id, EXTRACT(YEAR FROM r.date)::int, b.dimension, b.bucket,
+           SUM(r.value), SUM(r.value * r.value), COUNT(*)
+    FROM (
+        SELECT 'station' AS source, site_id, pollutant_id, date, hour, value FROM measurements
+        WHERE value IS NOT NULL AND NOT is_filled
+        UNION ALL
+        SELECT 'tif', site_id, pollutant_id, date, hour, value FROM measurements_tif
+        WHERE value IS NOT NULL AND NOT is_filled
+    ) r
+    CROSS JOIN LATERAL (VALUES
+        ('hour', r.hour),
+        ('weekday', EXTRACT(ISODOW FROM r.date)::int),
+        ('month', EXTRACT(MONTH FROM r.date)::int)
+    ) AS b(dimension, bucket)
+    GROUP BY r.source, r.pollutant_id, b.dimension, r.site_id, 4, b.bucket;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE ingest_jobs (
+    id            VARCHAR(32) PRIMARY KEY,
+    kind          VARCHAR(10) NOT NULL CHECK (kind IN ('csv', 'tif')),
+    path          TEXT NOT NULL,
+    start_date    DATE,
+    end_date      DATE,
+    status        VARCHAR(12) NOT NULL DEFAULT 'queued',
+    files_total   INT NOT NULL DEFAULT 0,
+    files_done    INT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    errors        JSONB NOT NULL DEFAULT '[]',
+    stages_s      JSONB NOT NULL DEFAULT '{}',
+    created_at    TIMESTAMP NOT NULL,
+    started_at    TIMESTAMP,
+    finished_at   TIMESTAMP
+);
+COMMENT ON TABLE ingest_jobs IS '后端后台导入任务的状态与进度；所有 uvicorn worker 共用，任一 worker 都能查询或取消';
+COMMENT ON COLUMN ingest_jobs.status IS 'queued / running / succeeded / partial（部分文件出错）/ failed / cancelled';
+COMMENT ON COLUMN ingest_jobs.errors IS '出错文件的错误信息，最多保留 50 条';
+COMMENT ON COLUMN ingest_jobs.stages_s IS '各阶段累计耗时（秒），由执行任务的 worker 每处理完一个文件更新一次';
+CREATE INDEX ingest_jobs_finished_at ON ingest_jobs (finished_at);
+
 -- 插入监测点数据到sites表
 INSERT INTO sites (site_name, longitude, latitude) VALUES
 ('东城东四', 116.417, 39.929),
@@ -106,4 +364,26 @@ INSERT INTO pollutants (pollutant_id,pollutant_name) VALUES(1,'NO2')
 
 
 -- 对于站点数据 的插入执行。/tools/importMeasurements.py
--- 对于tif数据 的插入执行。/tools/importTifMeasurements.py
\ No newline at end of file
+-- 对于tif数据 的插入执行。/tools/importTifMeasurements.py
+-- TIF 校正系数拟合与校正栅格输出。/tools/calibrateTif.py
+-- 缺测小时检测与插补。/tools/fillGaps.py
+-- 逐小时栅格按天合并为 24 波段 COG。/tools/compactDailyCog.py
+-- 内存映射时间序列存储重建。/tools/seriesStore.py
+-- 按 污染物/年/月 分区增量导出 Parquet（供后端 DuckDB 统计接口使用）。/tools/exportParquet.py
+-- 已有数据库升级：
+--   ALTER TABLE measurements ADD COLUMN IF NOT EXISTS is_filled BOOLEAN NOT NULL DEFAULT FALSE;
+--   ALTER TABLE measurements_tif ADD COLUMN IF NOT EXISTS is_filled BOOLEAN NOT NULL DEFAULT FALSE;
+--   再执行上面的 CREATE TABLE data_versions 与 CREATE OR REPLACE FUNCTION notify_measurements_ingested()；
+--   已有数据无需回填：没有记录的日期视为自开始跟踪以来未变化。
+--   climatology：执行上面的 CREATE TABLE climatology、两个函数与四个触发器，再执行一次 SELECT refresh_climatology(); 回填历史数据。
+--   实测值覆盖插补值：执行上面的 measurements_updated / measurements_tif_updated 两个触发器，
+--   以及新版 accumulate_climatology() 与 measurements_climatology_update / measurements_tif_climatology_update。
+--   通知负载不再包含 site_ids：重新执行 CREATE OR REPLACE FUNCTION notify_measurements_ingested()。
+--   通知按 污染物/日期 拆分（负载为 date + hours）：再次执行 CREATE OR REPLACE FUNCTION notify_measurements_ingested()，
+--   并与新版后端同时上线（旧后端无法解析新负载）。
+--   增量拟合高水位：执行上面的 CREATE TABLE calibration_state 与 CREATE INDEX measurements_tif_pollutant_date；
+--   首次运行 calibrateTif.py 时没有高水位，会完整扫描一次。
+--   校正值表不再包含插补小时：执行一次
+--   DELETE FROM measurements_tif_corrected x USING measurements_tif t WHERE t.distinct_id = x.distinct_id AND t.is_filled;
+--   增量插补高水位：执行上面的 CREATE TABLE fill_state；首次运行 fillGaps.py 时没有高水位，会完整扫描一次。
+--   后台导入任务：执行上面的 CREATE TABLE ingest_jobs 与 CREATE INDEX ingest_jobs_finished_at。
\ No newline at end of file
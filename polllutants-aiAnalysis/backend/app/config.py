@@ -1,7 +1,12 @@
 from functools import lru_cache
-from pydantic import Field
+from pathlib import Path
+
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 
+# backend 目录；目录类配置的相对路径都相对于它解析，与 uvicorn 的启动目录无关
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
 
 class Settings(BaseSettings):
     """Centralised backend configuration."""
@@ -22,6 +27,52 @@ class Settings(BaseSettings):
         alias="CORS_ORIGINS",
     )
 
+    # 采样分析：开启后请求带上 ?profile=1 即返回该请求期间的调用栈采样，生产环境请保持关闭
+    enable_profiling: bool = Field(default=False, alias="ENABLE_PROFILING")
+    profile_interval_ms: float = Field(default=5.0, alias="PROFILE_INTERVAL_MS")
+
+    # SSE 推送：无新数据时发送心跳注释的间隔（秒）
+    stream_keepalive_seconds: float = Field(default=15.0, alias="STREAM_KEEPALIVE_SECONDS")
+
+    # 后台导入任务：只允许导入 INGEST_ROOT 之下的路径；所有 worker 的所有任务合计最多 INGEST_CONCURRENCY 个文件
+    # 同时导入（advisory lock 名额）；任务记录保存在 ingest_jobs 表，结束 INGEST_JOB_TTL_HOURS 小时后清理
+    ingest_root: str = Field(default="../../database", alias="INGEST_ROOT")
+    tools_dir: str = Field(default="../../tools", alias="TOOLS_DIR")
+    ingest_concurrency: int = Field(default=2, alias="INGEST_CONCURRENCY")
+    ingest_job_ttl_hours: float = Field(default=24.0, alias="INGEST_JOB_TTL_HOURS")
+
+    # 事件检测：单次请求的日期跨度上限（天）；逐小时矩阵按 EVENTS_SITE_CHUNK 个站点一批装入，限制单批内存
+    events_max_days: int = Field(default=366, alias="EVENTS_MAX_DAYS")
+    events_site_chunk: int = Field(default=100, alias="EVENTS_SITE_CHUNK")
+
+    # 内存映射时间序列存储（由 tools/seriesStore.py 与导入脚本维护）；留空则 /api/analysis 始终查询数据库
+    series_store_dir: str = Field(default="../../database/series", alias="SERIES_STORE_DIR")
+
+    # 长周期统计：DuckDB 扫描 tools/exportParquet.py 导出的 Parquet，OLAP_THREADS 限制其占用的 CPU
+    parquet_dir: str = Field(default="../../database/parquet", alias="PARQUET_DIR")
+    olap_threads: int = Field(default=2, alias="OLAP_THREADS")
+
+    # HTTP 缓存：结束日期早于 今天 - CACHE_SETTLED_DAYS 的区间视为不再变化，允许浏览器直接缓存 CACHE_MAX_AGE 秒；
+    # 不小于 COMPRESS_MIN_SIZE 字节的响应按 Accept-Encoding 做 Brotli / gzip 压缩
+    cache_settled_days: int = Field(default=2, alias="CACHE_SETTLED_DAYS")
+    cache_max_age: int = Field(default=86400, alias="CACHE_MAX_AGE")
+    compress_min_size: int = Field(default=1024, alias="COMPRESS_MIN_SIZE")
+
+    # 启动预热：worker 开始接收请求前查询站点/污染物目录，并按 WARMUP_CONCURRENCY 个连接
+    # 预取每个 站点/污染物 最近 WARMUP_DAYS 天的分析数据，填充连接池、数据库缓冲区与时间序列存储的页缓存
+    warmup_on_startup: bool = Field(default=True, alias="WARMUP_ON_STARTUP")
+    warmup_days: int = Field(default=7, alias="WARMUP_DAYS")
+    warmup_concurrency: int = Field(default=4, alias="WARMUP_CONCURRENCY")
+    warmup_timeout_seconds: float = Field(default=20.0, alias="WARMUP_TIMEOUT_SECONDS")
+
+    @field_validator("ingest_root", "tools_dir", "series_store_dir", "parquet_dir")
+    @classmethod
+    def resolve_dir(cls, value: str) -> str:
+        # 留空表示关闭（SERIES_STORE_DIR）；其余相对路径按 backend 目录解析
+        if not value or Path(value).is_absolute():
+            return value
+        return str((BACKEND_DIR / value).resolve())
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,11 +1,17 @@
-from datetime import date
-from typing import List
+import logging
+from datetime import date, timedelta
+from typing import List, Optional
 
-from sqlalchemy import and_, select
+import numpy as np
+from sqlalchemy import and_, func, select, tuple_
 from sqlalchemy.orm import Session
 
-from .models import Measurement, MeasurementTif, Pollutant, Site
+from .detection import HourlyGrid, detect_events
+from .metrics import SERIES_STORE_READS
+from .models import Climatology, DataVersion, Measurement, MeasurementTif, Pollutant, Site
+from .series_store import get_store
 
+logger = logging.getLogger(__name__)
 
 def list_sites(db: Session) -> List[Site]:
     stmt = select(Site).order_by(Site.site_name.asc())
@@ -23,7 +29,13 @@ def build_chart_data(
     pollutant_id: int,
     start_date: date,
     end_date: date,
+    revision: Optional[str] = None,
 ):
+    """revision 为 data_revision 的结果：给定时，时间序列存储只有在与该版本一致时才走快速路径。"""
+    cached = _chart_data_from_store(site_id, pollutant_id, start_date, end_date, revision)
+    if cached is not None:
+        return cached
+
     base_filter = and_(
         Measurement.site_id == site_id,
         Measurement.pollutant_id == pollutant_id,
@@ -57,6 +69,8 @@ def build_chart_data(
             "timestamp": k,
             "stationValue": row.value,
             "tifValue": None,
+            "stationFilled": row.is_filled,
+            "tifFilled": False,
         }
 
     for row in tif_rows:
@@ -68,12 +82,272 @@ def build_chart_data(
                 "timestamp": k,
                 "stationValue": None,
                 "tifValue": row.value,
+                "stationFilled": False,
+                "tifFilled": row.is_filled,
             }
         else:
             merged[k]["tifValue"] = row.value
+            merged[k]["tifFilled"] = row.is_filled
 
     sorted_values = sorted(
         merged.values(), key=lambda item: (item["date"], item["hour"])
     )
     return sorted_values
 
+
+def _chart_data_from_store(
+    site_id: int, pollutant_id: int, start_date: date, end_date: date, revision: Optional[str] = None
+):
+    """
+    两个数据源在整个区间都已写入时间序列存储（且存储记录的数据版本与 revision 一致）时，
+    直接切片组装，不查数据库。导入已提交而同步尚未完成的区间回退到 SQL；
+    存储不可用（模块无法加载、文件损坏等）时同样回退，不让请求失败。
+    """
+    if end_date < start_date:
+        return None
+    try:
+        store = get_store()
+        if store is None:
+            return None
+        station = store.read("station", pollutant_id, site_id, start_date, end_date, revision)
+        tif = store.read("tif", pollutant_id, site_id, start_date, end_date, revision) if station is not None else None
+    except Exception:
+        logger.warning("series store unavailable, falling back to SQL", exc_info=True)
+        SERIES_STORE_READS.inc("error")
+        return None
+    if station is None or tif is None:
+        SERIES_STORE_READS.inc("miss")
+        return None
+    SERIES_STORE_READS.inc("hit")
+    (station, station_filled), (tif, tif_filled) = station, tif
+
+    def as_float(value):
+        # 存储为 float32，按 7 位有效数字还原，与数据库中的原值一致
+        return None if value != value else float(f"{value:.7g}")
+
+    points = []
+    for offset in np.flatnonzero(~(np.isnan(station) & np.isnan(tif))).tolist():
+        day = start_date + timedelta(days=offset // 24)
+        hour = offset % 24
+        points.append(
+            {
+                "date": day,
+                "hour": hour,
+                "timestamp": f"{day.isoformat()} {hour:02d}:00",
+                "stationValue": as_float(station[offset]),
+                "tifValue": as_float(tif[offset]),
+                "stationFilled": bool(station_filled[offset]),
+                "tifFilled": bool(tif_filled[offset]),
+            }
+        )
+    return points
+
+
+
+def load_hourly_grid(
+    db: Session,
+    pollutant_id: int,
+    start_date: date,
+    end_date: date,
+    site_ids: Optional[List[int]] = None,
+) -> HourlyGrid:
+    """一次查询把站点值与 TIF 值装入 [站点 × 小时] 稠密矩阵；插补值视为缺测，不参与事件检测。"""
+    rows_by_source = []
+    for model in (Measurement, MeasurementTif):
+        stmt = select(model.site_id, model.date, model.hour, model.value).where(
+            model.pollutant_id == pollutant_id,
+            model.date >= start_date,
+            model.date <= end_date,
+            model.value.is_not(None),
+            model.is_filled.is_(False),
+        )
+        if site_ids:
+            stmt = stmt.where(model.site_id.in_(site_ids))
+        rows_by_source.append(db.execute(stmt).all())
+
+    start_ordinal = start_date.toordinal()
+    hours = ((end_date.toordinal() - start_ordinal) + 1) * 24
+    all_sites = sorted(
+        set(site_ids or []) | {row.site_id for rows in rows_by_source for row in rows}
+    )
+    grid_sites = np.asarray(all_sites, dtype=np.int64)
+
+    grids = []
+    for rows in rows_by_source:
+        grid = np.full((grid_sites.size, hours), np.nan)
+        if rows:
+            sites, dates, hour_values, values = zip(*rows)
+            row_index = np.searchsorted(grid_sites, np.asarray(sites, dtype=np.int64))
+            ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+            col_index = (ordinals - start_ordinal) * 24 + np.asarray(hour_values, dtype=np.int64)
+            grid[row_index, col_index] = np.asarray(values, dtype=float)
+        grids.append(grid)
+
+    return HourlyGrid(site_ids=grid_sites, start_ordinal=start_ordinal, station=grids[0], tif=grids[1])
+
+
+def build_event_intervals(
+    db: Session,
+    pollutant_id: int,
+    start_date: date,
+    end_date: date,
+    site_ids: Optional[List[int]] = None,
+    threshold: float = 200.0,
+    zscore_window: int = 24,
+    zscore_threshold: float = 3.0,
+    divergence_threshold: float = 40.0,
+    min_hours: int = 1,
+    site_chunk: int = 100,
+):
+    """各站点的检测互不相关，按 site_chunk 个站点一批装入矩阵，全网多年的请求也只占一批的内存。"""
+    if site_ids:
+        all_sites = sorted(set(site_ids))
+    else:
+        all_sites = db.scalars(select(Site.site_id).order_by(Site.site_id)).all()
+
+    events = []
+    site_chunk = max(site_chunk, 1)
+    # 站点按 site_id 升序分批，拼接后仍按站点、起点有序
+    for offset in range(0, len(all_sites), site_chunk):
+        grid = load_hourly_grid(db, pollutant_id, start_date, end_date, all_sites[offset:offset + site_chunk])
+        events += detect_events(
+            grid,
+            threshold=threshold,
+            zscore_window=zscore_window,
+            zscore_threshold=zscore_threshold,
+            divergence_threshold=divergence_threshold,
+            min_hours=min_hours,
+        )
+
+    origin = start_date
+
+    def stamp(hour_offset: int) -> str:
+        day = origin + timedelta(days=hour_offset // 24)
+        return f"{day.isoformat()} {hour_offset % 24:02d}:00"
+
+    for event in events:
+        start_hour = event.pop("start_hour")
+        end_hour = event.pop("end_hour")
+        event["pollutant_id"] = pollutant_id
+        event["start"] = stamp(start_hour)
+        event["end"] = stamp(end_hour - 1)
+        event["hours"] = end_hour - start_hour
+    return events
+
+
+def list_ingested_rows(
+    db: Session,
+    source: str,
+    pairs,
+    day: date,
+    hours,
+) -> dict:
+    """按 (站点, 污染物) 返回一次导入在某一天写入的那些小时的数据点。"""
+    model = Measurement if source == "station" else MeasurementTif
+    stmt = (
+        select(model.site_id, model.pollutant_id, model.date, model.hour, model.value, model.is_filled)
+        .where(
+            tuple_(model.site_id, model.pollutant_id).in_(list(pairs)),
+            model.date == day,
+            model.hour.in_(list(hours)),
+        )
+        .order_by(model.hour)
+    )
+
+    points: dict[tuple, list] = {}
+    for row in db.execute(stmt):
+        points.setdefault((row.site_id, row.pollutant_id), []).append(
+            {
+                "date": row.date.isoformat(),
+                "hour": row.hour,
+                "timestamp": f"{row.date.isoformat()} {row.hour:02d}:00",
+                "value": row.value,
+                "filled": row.is_filled,
+            }
+        )
+    return points
+
+
+def latest_date(db: Session, site_id: int, pollutant_id: int) -> Optional[date]:
+    """站点数据与 TIF 数据中该 站点/污染物 最新的日期；走 (site_id, pollutant_id, date, hour) 唯一索引，不扫表。"""
+    latest = None
+    for model in (Measurement, MeasurementTif):
+        stmt = select(func.max(model.date)).where(model.site_id == site_id, model.pollutant_id == pollutant_id)
+        value = db.scalar(stmt)
+        if value is not None and (latest is None or value > latest):
+            latest = value
+    return latest
+
+
+def data_revision(
+    db: Session,
+    site_id: int,
+    pollutant_id: int,
+    start_date: date,
+    end_date: date,
+) -> str:
+    """区间内数据的版本标识：天数与写入次数之和，区间内任何一天有新写入都会改变（只增不减）。"""
+    stmt = select(func.count(), func.coalesce(func.sum(DataVersion.revision), 0)).where(
+        DataVersion.site_id == site_id,
+        DataVersion.pollutant_id == pollutant_id,
+        DataVersion.date >= start_date,
+        DataVersion.date <= end_date,
+    )
+    days, revisions = db.execute(stmt).one()
+    return f"{days}.{revisions}"
+
+
+def build_profiles(
+    db: Session,
+    pollutant_id: int,
+    dimension: str,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    site_ids: Optional[List[int]] = None,
+    combine_sites: bool = False,
+) -> List[dict]:
+    """按 小时/星期/月份 分组的均值与标准差，站点与 TIF 并列；只读预聚合的 climatology 表，不扫描明细。"""
+    # combine_sites 时把所选站点合并成一条曲线（按小时数加权），否则每个站点一条
+    group_by = [Climatology.source, Climatology.bucket]
+    if not combine_sites:
+        group_by.append(Climatology.site_id)
+
+    stmt = select(
+        *group_by,
+        func.sum(Climatology.value_sum).label("value_sum"),
+        func.sum(Climatology.value_sq_sum).label("value_sq_sum"),
+        func.sum(Climatology.value_count).label("value_count"),
+    ).where(
+        Climatology.pollutant_id == pollutant_id,
+        Climatology.dimension == dimension,
+    )
+    if start_year is not None:
+        stmt = stmt.where(Climatology.year >= start_year)
+    if end_year is not None:
+        stmt = stmt.where(Climatology.year <= end_year)
+    if site_ids:
+        stmt = stmt.where(Climatology.site_id.in_(site_ids))
+    stmt = stmt.group_by(*group_by)
+
+    profiles: dict[tuple, dict] = {}
+    for row in db.execute(stmt):
+        count = int(row.value_count)
+        if count <= 0:
+            # 更新触发器会先减去旧值，某些分组可能被减到 0
+            continue
+        site_id = None if combine_sites else row.site_id
+        point = profiles.setdefault(
+            (site_id, row.bucket),
+            {"site_id": site_id, "bucket": row.bucket, "stationCount": 0, "tifCount": 0},
+        )
+        mean = row.value_sum / count
+        # 总体标准差；累计量相减可能出现极小的负数舍入误差
+        std = max(row.value_sq_sum / count - mean * mean, 0.0) ** 0.5
+        point[f"{row.source}Mean"] = mean
+        point[f"{row.source}Std"] = std
+        point[f"{row.source}Count"] = count
+
+    return sorted(
+        profiles.values(),
+        key=lambda item: (item["site_id"] if item["site_id"] is not None else -1, item["bucket"]),
+    )
@@ -1,13 +1,20 @@
+import os
+import threading
+from typing import Optional
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from .config import get_settings
+from .metrics import instrument_engine
 
-
-settings = get_settings()
-
-engine = create_engine(settings.database_url, echo=False, future=True)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+# 引擎与连接池在第一次使用时按进程创建：导入本模块不连接数据库，
+# fork 出的 worker 也不会沿用父进程池里的连接
+_engine: Optional[Engine] = None
+_engine_pid: Optional[int] = None
+_session_factory: Optional[sessionmaker] = None
+_engine_lock = threading.Lock()
 
 
 class Base(DeclarativeBase):
@@ -16,10 +23,38 @@ class Base(DeclarativeBase):
     pass
 
 
+def get_engine() -> Engine:
+    global _engine, _engine_pid, _session_factory
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            if _engine is not None:
+                # 继承自父进程的池：只丢弃引用，不关闭父进程仍在使用的连接
+                _engine.dispose(close=False)
+            settings = get_settings()
+            _engine = create_engine(settings.database_url, echo=False, future=True)
+            instrument_engine(_engine)
+            _session_factory = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True)
+            _engine_pid = os.getpid()
+        return _engine
+
+
+def new_session() -> Session:
+    get_engine()
+    return _session_factory()
+
+
+def dispose_engine() -> None:
+    """关闭本进程的连接池（应用关闭时调用），下次使用时重新创建。"""
+    global _engine, _engine_pid, _session_factory
+    with _engine_lock:
+        if _engine is not None and _engine_pid == os.getpid():
+            _engine.dispose()
+        _engine = _engine_pid = _session_factory = None
+
+
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
         db.close()
-
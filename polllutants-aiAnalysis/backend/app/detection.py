@@ -0,0 +1,113 @@
+"""逐小时序列的事件检测：超标、滚动 z-score 异常、站点与 TIF 偏离。
+
+所有函数都作用于形如 [站点 × 小时] 的稠密矩阵（缺测为 NaN），
+一次调用即可完成全网多个站点、多年数据的扫描，无需逐站点循环。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class HourlyGrid:
+    """按站点对齐的逐小时稠密矩阵，列 0 对应 start_date 00 时。"""
+
+    site_ids: np.ndarray
+    start_ordinal: int
+    station: np.ndarray
+    tif: np.ndarray
+
+    @property
+    def hours(self) -> int:
+        return self.station.shape[1]
+
+
+def find_runs(mask: np.ndarray, min_length: int = 1):
+    """返回二维布尔矩阵中每行连续 True 区间的 (行号, 起点, 终点[不含])。"""
+    mask = np.atleast_2d(np.asarray(mask, dtype=bool))
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    # np.nonzero 按行优先返回，起点与终点天然一一配对
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    keep = (ends - starts) >= min_length
+    return rows[keep], starts[keep], ends[keep]
+
+
+def run_peaks(values: np.ndarray, rows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """计算每个区间内的最大值（忽略 NaN）。"""
+    if rows.size == 0:
+        return np.empty(0, dtype=float)
+    width = values.shape[1]
+    flat = np.append(values.astype(float).ravel(), np.nan)
+    bounds = np.empty(rows.size * 2, dtype=np.int64)
+    bounds[0::2] = rows * width + starts
+    bounds[1::2] = rows * width + ends
+    return np.fmax.reduceat(flat, bounds)[0::2]
+
+
+def rolling_zscore(values: np.ndarray, window: int, min_periods: int | None = None) -> np.ndarray:
+    """以前 window 小时（不含当前小时）为基准计算 z-score（总体标准差，与 tools/exceedanceReport.py 一致），样本不足处为 NaN。"""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    min_periods = window // 2 if min_periods is None else min_periods
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    def prefix(array):
+        out = np.zeros((array.shape[0], array.shape[1] + 1))
+        np.cumsum(array, axis=1, out=out[:, 1:])
+        return out
+
+    sums, squares, counts = prefix(filled), prefix(filled * filled), prefix(valid.astype(float))
+    index = np.arange(values.shape[1])
+    lower = np.maximum(index - window, 0)
+
+    n = counts[:, index] - counts[:, lower]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sums[:, index] - sums[:, lower]) / n
+        variance = (squares[:, index] - squares[:, lower]) / n - mean * mean
+        std = np.sqrt(np.clip(variance, 0.0, None))
+        z = (values - mean) / std
+    z[(n < max(min_periods, 2)) | (std < 1e-9) | ~valid] = np.nan
+    return z
+
+
+def _collect(grid: HourlyGrid, mask, magnitude, event_type: str, source: str, min_hours: int):
+    rows, starts, ends = find_runs(mask, min_hours)
+    peaks = run_peaks(magnitude, rows, starts, ends)
+    return [
+        {
+            "site_id": int(grid.site_ids[row]),
+            "event_type": event_type,
+            "source": source,
+            "start_hour": int(start),
+            "end_hour": int(end),
+            "peak_value": None if np.isnan(peak) else round(float(peak), 2),
+        }
+        for row, start, end, peak in zip(rows, starts, ends, peaks)
+    ]
+
+
+def detect_events(
+    grid: HourlyGrid,
+    threshold: float,
+    zscore_window: int,
+    zscore_threshold: float,
+    divergence_threshold: float,
+    min_hours: int = 1,
+):
+    """对整张矩阵一次性检测三类事件，返回按站点、起点排序的区间列表。"""
+    events = []
+    with np.errstate(invalid="ignore"):
+        for source, values in (("station", grid.station), ("tif", grid.tif)):
+            events += _collect(grid, values > threshold, values, "exceedance", source, min_hours)
+
+            z = rolling_zscore(values, zscore_window)
+            events += _collect(grid, np.abs(z) >= zscore_threshold, np.abs(z), "anomaly", source, min_hours)
+
+        gap = np.abs(grid.station - grid.tif)
+        events += _collect(grid, gap >= divergence_threshold, gap, "divergence", "station-tif", min_hours)
+
+    events.sort(key=lambda item: (item["site_id"], item["start_hour"], item["event_type"]))
+    return events
@@ -0,0 +1,173 @@
+"""HTTP 缓存与压缩。
+
+- ETag：/api/analysis 由区间内数据的版本（data_versions，导入触发器维护）生成，
+  不用先查数据就能判断客户端缓存是否仍然有效；其余 JSON 接口按响应内容的哈希生成；
+- If-None-Match 命中时直接返回 304；
+- Cache-Control：已结束且不再变化的历史区间允许浏览器直接缓存，其余响应每次都用 ETag 重新验证；
+- CompressionMiddleware：按 Accept-Encoding 做 Brotli（安装了 brotli 时）/ gzip 压缩，
+  压缩后的 ETag 带上编码后缀，保证不同编码的表示有不同的强校验值。
+"""
+import gzip
+import hashlib
+import json
+from datetime import date, timedelta
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from .config import get_settings
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，缺失时只用 gzip
+    brotli = None
+
+# 响应格式变化时修改，使旧 ETag 全部失效
+ETAG_SCHEME = "1"
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in (ETAG_SCHEME, *parts)).encode("utf-8"))
+    return f'"{digest.hexdigest()[:24]}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha1(body).hexdigest()[:24]}"'
+
+
+def _strip_tag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[: -len(suffix) - 1] + '"'
+    return tag
+
+
+def matching_etag(request: Request, etag: str) -> Optional[str]:
+    """返回 If-None-Match 中与 etag 匹配的那个值（保留客户端持有的编码后缀），不匹配返回 None。"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    for tag in header.split(","):
+        if tag.strip() == "*":
+            return etag
+        if _strip_tag(tag) == etag:
+            return tag.strip()
+    return None
+
+
+def cache_control_for_range(end_date: date) -> str:
+    settings = get_settings()
+    if end_date < date.today() - timedelta(days=settings.cache_settled_days):
+        return f"public, max-age={settings.cache_max_age}, immutable"
+    return "no-cache"
+
+
+def not_modified(matched: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": matched, "Cache-Control": cache_control})
+
+
+def render_json(payload: Any) -> bytes:
+    """与 FastAPI 默认 JSONResponse 相同的序列化方式。"""
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def json_response(request: Request, body: bytes, etag: Optional[str] = None, cache_control: str = "no-cache"):
+    etag = etag or body_etag(body)
+    matched = matching_etag(request, etag)
+    if matched:
+        return not_modified(matched, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """纯 ASGI 压缩中间件；SSE 流、已编码的响应以及 304 / 204 原样透传。"""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith("text/event-stream")
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
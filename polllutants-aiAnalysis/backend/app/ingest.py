@@ -0,0 +1,436 @@
+"""后台导入任务：复用 tools/ 中的 CSV / TIF 导入逻辑。
+
+任务状态保存在 PostgreSQL 的 ingest_jobs 表中，多个 uvicorn worker 都能查询、取消任意任务；
+文件由提交任务的 worker 的线程池执行。每个文件导入前先占用 INGEST_CONCURRENCY 个 advisory lock
+名额之一，因此无论有多少个 worker、同时提交多少任务，导入对数据库的并发压力都有上限，
+不会与 API 查询无序竞争。结束超过 INGEST_JOB_TTL_HOURS 小时的任务会被清理。
+"""
+import glob
+import importlib
+import os
+import re
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .config import get_settings
+from .database import get_engine, new_session
+from .models import IngestJobRecord
+
+MAX_ERRORS_KEPT = 50
+CSV_DATE_PATTERN = re.compile(r"(\d{8})")
+# pg_try_advisory_lock(INGEST_LOCK_CLASS, 名额) 的第一个键，与 tools/seriesStore.py 的同步锁互不冲突
+INGEST_LOCK_CLASS = 20340002
+SLOT_POLL_SECONDS = 0.5
+
+
+class IngestPathError(ValueError):
+    pass
+
+
+class IngestUnavailable(RuntimeError):
+    """tools/ 下的导入脚本无法加载（TOOLS_DIR 错误或缺少 pandas / rasterio 等依赖）。"""
+
+
+_importers = None
+_importers_lock = threading.Lock()
+
+
+def load_tool(name: str):
+    """按 TOOLS_DIR 导入 tools/ 下的脚本模块。"""
+    tools_dir = os.path.abspath(get_settings().tools_dir)
+    if tools_dir not in sys.path:
+        sys.path.insert(0, tools_dir)
+    return importlib.import_module(name)
+
+
+def load_importers():
+    """导入 tools/ 下的导入脚本模块（只导入一次）。"""
+    global _importers
+    with _importers_lock:
+        if _importers is None:
+            # 导入任务写入的时间序列存储与 API 快速路径读取的是同一个目录
+            series_store_dir = get_settings().series_store_dir
+            load_tool("seriesStore").SERIES_STORE_PATH = os.path.abspath(series_store_dir) if series_store_dir else None
+            _importers = (
+                load_tool("importMeasurements"),
+                load_tool("importTifMeasurements"),
+                load_tool("importStats"),
+            )
+    return _importers
+
+
+@dataclass
+class IngestJob:
+    """提交任务的 worker 内部的执行上下文；对外可见的状态在 ingest_jobs 表中。"""
+
+    id: str
+    kind: str
+    files_total: int
+    stats: object
+    # 本进程已处理（含因取消而跳过）的文件数，全部处理完后移出 IngestManager._running
+    files_seen: int = 0
+    started: bool = False
+    # TIF 任务涉及的 (pollutant_id, 日期)，全部文件完成后统一同步时间序列存储
+    touched: set = field(default_factory=set)
+    cancelled: threading.Event = field(default_factory=threading.Event)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def in_range(day: Optional[date], start_date: Optional[date], end_date: Optional[date]) -> bool:
+    if day is None:
+        return True
+    if start_date and day < start_date:
+        return False
+    if end_date and day > end_date:
+        return False
+    return True
+
+
+def job_to_dict(record: IngestJobRecord) -> dict:
+    elapsed = None
+    if record.started_at:
+        elapsed = ((record.finished_at or datetime.now()) - record.started_at).total_seconds()
+    return {
+        "id": record.id,
+        "kind": record.kind,
+        "path": record.path,
+        "start_date": record.start_date,
+        "end_date": record.end_date,
+        "status": record.status,
+        "files_total": record.files_total,
+        "files_done": record.files_done,
+        "rows": record.rows_inserted,
+        "rows_per_s": round(record.rows_inserted / elapsed, 1) if elapsed else None,
+        "files_per_s": round(record.files_done / elapsed, 2) if elapsed else None,
+        "stages_s": record.stages_s or {},
+        "errors": list(record.errors or []),
+        "created_at": record.created_at,
+        "started_at": record.started_at,
+        "finished_at": record.finished_at,
+    }
+
+
+class IngestManager:
+    def __init__(self):
+        self._running: dict[str, IngestJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=get_settings().ingest_concurrency, thread_name_prefix="ingest"
+                )
+            return self._executor
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with new_session() as db:
+            record = db.get(IngestJobRecord, job_id)
+            return job_to_dict(record) if record is not None else None
+
+    def all_jobs(self) -> list[dict]:
+        self._prune()
+        with new_session() as db:
+            records = db.scalars(select(IngestJobRecord).order_by(IngestJobRecord.created_at.desc())).all()
+            return [job_to_dict(record) for record in records]
+
+    def resolve_path(self, path: str) -> str:
+        root = os.path.realpath(get_settings().ingest_root)
+        target = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, target]) != root:
+            raise IngestPathError("path 必须位于 INGEST_ROOT 之内")
+        if not os.path.exists(target):
+            raise FileNotFoundError(path)
+        return target
+
+    def submit(self, kind: str, path: str, start_date=None, end_date=None) -> dict:
+        target = self.resolve_path(path)
+        try:
+            import_csv, import_tif, import_stats = load_importers()
+        except Exception as exc:
+            raise IngestUnavailable(
+                f"导入模块不可用（TOOLS_DIR={get_settings().tools_dir}）: {type(exc).__name__}: {exc}"
+            ) from exc
+        self._prune()
+
+        files = self._discover(kind, target, start_date, end_date)
+        now = datetime.now()
+        record = IngestJobRecord(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            path=path,
+            start_date=start_date,
+            end_date=end_date,
+            status="queued" if files else "succeeded",
+            files_total=len(files),
+            files_done=0,
+            rows_inserted=0,
+            errors=[],
+            stages_s={},
+            created_at=now,
+            finished_at=None if files else now,
+        )
+        mappings = self._load_mappings(kind, import_csv, import_tif) if files else None
+        with new_session() as db:
+            db.add(record)
+            db.commit()
+            snapshot = job_to_dict(record)
+        if not files:
+            return snapshot
+
+        job = IngestJob(
+            id=record.id, kind=kind, files_total=len(files), stats=import_stats.ImportStats(f"job-{record.id[:8]}")
+        )
+        with self._lock:
+            self._running[job.id] = job
+        for file_path in files:
+            self.executor.submit(self._run_file, job, file_path, mappings)
+        return snapshot
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """任一 worker 都可取消：只改表中的状态，执行任务的 worker 在处理下一个文件前读到后停止。"""
+        with new_session() as db:
+            db.execute(
+                update(IngestJobRecord)
+                .where(IngestJobRecord.id == job_id, IngestJobRecord.status.in_(("queued", "running")))
+                .values(status="cancelled", finished_at=datetime.now())
+            )
+            db.commit()
+        with self._lock:
+            job = self._running.get(job_id)
+        if job is not None:
+            job.cancelled.set()
+        return self.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = datetime.now() - timedelta(hours=get_settings().ingest_job_ttl_hours)
+        with new_session() as db:
+            db.execute(delete(IngestJobRecord).where(IngestJobRecord.finished_at < cutoff))
+            db.commit()
+
+    def _discover(self, kind: str, target: str, start_date, end_date) -> list[str]:
+        if os.path.isfile(target):
+            return [target]
+        if kind == "csv":
+            files = []
+            for csv_path in sorted(glob.glob(os.path.join(target, "*.csv"))):
+                match = CSV_DATE_PATTERN.search(os.path.basename(csv_path))
+                day = datetime.strptime(match.group(1), "%Y%m%d").date() if match else None
+                if in_range(day, start_date, end_date):
+                    files.append(csv_path)
+            return files
+
+        files = []
+        for tif_path in sorted(glob.glob(os.path.join(target, "**", "*.tif"), recursive=True)):
+            match = re.search(r"(\d{4}_\d{2}_\d{2})", tif_path)
+            day = datetime.strptime(match.group(1), "%Y_%m_%d").date() if match else None
+            if in_range(day, start_date, end_date):
+                files.append(tif_path)
+        return files
+
+    def _load_mappings(self, kind: str, import_csv, import_tif):
+        conn = get_engine().raw_connection()
+        try:
+            cur = conn.cursor()
+            if kind == "csv":
+                mappings = import_csv.load_id_mappings(cur)
+            else:
+                mappings = import_tif.load_pollutant_mapping(cur)
+            cur.close()
+            return mappings
+        finally:
+            conn.close()
+
+    def _is_cancelled(self, job: IngestJob) -> bool:
+        if job.cancelled.is_set():
+            return True
+        with new_session() as db:
+            status = db.scalar(select(IngestJobRecord.status).where(IngestJobRecord.id == job.id))
+        if status in (None, "cancelled"):
+            job.cancelled.set()
+            return True
+        return False
+
+    def _acquire_slot(self, conn, job: IngestJob) -> Optional[int]:
+        """在导入连接上占用一个全局并发名额（会话级 advisory lock），任务取消时返回 None。"""
+        slots = max(get_settings().ingest_concurrency, 1)
+        cur = conn.cursor()
+        try:
+            # 取消请求可能由其他 worker 处理，等待期间按表中状态判断
+            while not self._is_cancelled(job):
+                for slot in range(slots):
+                    cur.execute("SELECT pg_try_advisory_lock(%s, %s)", (INGEST_LOCK_CLASS, slot))
+                    if cur.fetchone()[0]:
+                        conn.commit()
+                        return slot
+                conn.commit()
+                job.cancelled.wait(SLOT_POLL_SECONDS)
+            return None
+        finally:
+            cur.close()
+
+    def _release_slot(self, conn, slot: int) -> None:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT pg_advisory_unlock(%s, %s)", (INGEST_LOCK_CLASS, slot))
+            conn.commit()
+        finally:
+            cur.close()
+
+    def _run_file(self, job: IngestJob, file_path: str, mappings) -> None:
+        try:
+            if not self._is_cancelled(job):
+                self._import_file(job, file_path, mappings)
+        finally:
+            with job.lock:
+                job.files_seen += 1
+                done = job.files_seen == job.files_total
+            if done:
+                with self._lock:
+                    self._running.pop(job.id, None)
+                # 取消的 TIF 任务不会走到 _finish，已导入文件涉及的天在这里同步
+                if job.kind == "tif" and job.cancelled.is_set():
+                    self._sync_touched(job)
+
+    def _mark_running(self, job: IngestJob) -> None:
+        with job.lock:
+            if job.started:
+                return
+            job.started = True
+            job.stats.reset()
+        with new_session() as db:
+            db.execute(
+                update(IngestJobRecord)
+                .where(IngestJobRecord.id == job.id, IngestJobRecord.status == "queued")
+                .values(status="running", started_at=datetime.now())
+            )
+            db.commit()
+
+    def _import_file(self, job: IngestJob, file_path: str, mappings) -> None:
+        rows, error, touched, conn, slot = 0, None, set(), None, None
+        try:
+            # 加载导入模块、获取连接失败也要记入任务错误，否则任务会一直停在 running
+            import_csv, import_tif, _ = load_importers()
+            conn = get_engine().raw_connection()
+            slot = self._acquire_slot(conn, job)
+            if slot is None:
+                return
+            # 拿到名额后才算开始，排队等待期间保持 queued
+            self._mark_running(job)
+            if job.kind == "csv":
+                site_map, pollutant_map = mappings
+                cur = conn.cursor()
+                try:
+                    rows = import_csv.process_csv_and_insert(
+                        file_path, cur, site_map, pollutant_map, job.stats, touched=touched
+                    )
+                    conn.commit()
+                    with job.stats.stage("sync"):
+                        import_csv.sync_after_import(conn, "station", touched)
+                finally:
+                    cur.close()
+            else:
+                # 写入失败时 process_single_tif 回滚后抛出，与 CSV 一样记入 job.errors
+                rows = import_tif.process_single_tif(file_path, conn, mappings, job.stats, touched=touched)
+        except Exception as exc:
+            if conn is not None:
+                conn.rollback()
+            error = f"{os.path.basename(file_path)}: {type(exc).__name__}: {exc}"
+        finally:
+            if conn is not None:
+                try:
+                    if slot is not None:
+                        self._release_slot(conn, slot)
+                except Exception:
+                    # 解锁失败的连接不能放回连接池，否则名额会一直被占用
+                    conn.invalidate()
+                conn.close()
+
+        job.stats.add_file(rows, error=error is not None)
+        with job.lock:
+            job.touched |= touched
+        files_done, files_total = self._record_progress(job, rows, error)
+        if files_done < files_total:
+            return
+        if job.kind == "tif":
+            self._sync_touched(job)
+        self._finish(job)
+
+    def _record_progress(self, job: IngestJob, rows: int, error: Optional[str]) -> tuple[int, int]:
+        errors = IngestJobRecord.errors
+        if error is not None:
+            errors = case(
+                (
+                    func.jsonb_array_length(IngestJobRecord.errors) < MAX_ERRORS_KEPT,
+                    IngestJobRecord.errors.op("||")(literal([error], JSONB)),
+                ),
+                else_=IngestJobRecord.errors,
+            )
+        with new_session() as db:
+            files_done, files_total = db.execute(
+                update(IngestJobRecord)
+                .where(IngestJobRecord.id == job.id)
+                .values(
+                    files_done=IngestJobRecord.files_done + 1,
+                    rows_inserted=IngestJobRecord.rows_inserted + rows,
+                    errors=errors,
+                    stages_s=job.stats.as_dict()["stages_s"],
+                )
+                .returning(IngestJobRecord.files_done, IngestJobRecord.files_total)
+            ).one()
+            db.commit()
+        return files_done, files_total
+
+    def _append_error(self, job: IngestJob, error: str) -> None:
+        with new_session() as db:
+            db.execute(
+                update(IngestJobRecord)
+                .where(IngestJobRecord.id == job.id)
+                .values(errors=IngestJobRecord.errors.op("||")(literal([error], JSONB)))
+            )
+            db.commit()
+
+    def _finish(self, job: IngestJob) -> None:
+        with new_session() as db:
+            record = db.get(IngestJobRecord, job.id)
+            # 所有文件都在拿到名额前出错时任务仍是 queued
+            if record is None or record.status not in ("queued", "running"):
+                return
+            # 有文件出错时不报 succeeded：一行都没导入为 failed，部分导入为 partial
+            if not record.errors:
+                record.status = "succeeded"
+            else:
+                record.status = "partial" if record.rows_inserted else "failed"
+            record.finished_at = datetime.now()
+            record.stages_s = job.stats.as_dict()["stages_s"]
+            db.commit()
+
+    def _sync_touched(self, job: IngestJob) -> None:
+        """TIF 任务全部文件完成后，把涉及的天一次性同步到时间序列存储（失败时由 sync_after_import 作废这些天）。"""
+        if not job.touched:
+            return
+        conn = None
+        try:
+            _, import_tif, _ = load_importers()
+            conn = get_engine().raw_connection()
+            with job.stats.stage("sync"):
+                import_tif.sync_after_import(conn, "tif", job.touched)
+        except Exception as exc:
+            # 数据已入库，存储在同步成功前按数据版本回退到 SQL；只记录错误，不影响任务完成
+            self._append_error(job, f"sync: {type(exc).__name__}: {exc}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+manager = IngestManager()
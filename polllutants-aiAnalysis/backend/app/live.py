@@ -0,0 +1,127 @@
+"""新入库小时的实时推送。
+
+数据库在 measurements / measurements_tif 上的语句级触发器会在每次导入提交后
+NOTIFY measurements_ingested（见 database/database.sql），每个 污染物/日期 一条，负载只含数据源、
+污染物、日期与该天写入的小时。每个 worker 进程只开一个 LISTEN 连接，收到通知后只为订阅了该污染物的
+(站点, 污染物) 查询这些小时的行，再扇出到各自的 SSE 队列；本次没有写入的站点查不到行，不会推送。
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from itertools import count
+
+import psycopg2
+
+from . import crud
+from .config import get_settings
+from .database import new_session
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "measurements_ingested"
+
+
+@dataclass
+class Subscriber:
+    pairs: frozenset
+    queue: asyncio.Queue
+    loop: asyncio.AbstractEventLoop
+    id: int = field(default_factory=count().__next__)
+
+
+class IngestHub:
+    def __init__(self):
+        self._subscribers: dict[int, Subscriber] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, pairs, queue_size: int = 256) -> Subscriber:
+        subscriber = Subscriber(
+            pairs=frozenset(pairs),
+            queue=asyncio.Queue(maxsize=queue_size),
+            loop=asyncio.get_running_loop(),
+        )
+        with self._lock:
+            self._subscribers[subscriber.id] = subscriber
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen_forever, name="ingest-listener", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.pop(subscriber.id, None)
+
+    def _listen_forever(self) -> None:
+        settings = get_settings()
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    host=settings.db_host,
+                    port=settings.db_port,
+                    dbname=settings.db_name,
+                    user=settings.db_user,
+                    password=settings.db_password,
+                )
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        # 单条通知处理失败（负载异常、查询出错）只丢弃这一条，不断开 LISTEN
+                        try:
+                            self._dispatch(payload)
+                        except Exception:
+                            logger.exception("failed to dispatch ingest notification %s", payload)
+            except Exception:
+                logger.exception("ingest listener failed, reconnecting in 5s")
+            finally:
+                # 重连前关闭旧连接，避免泄漏出一个仍在 LISTEN 的会话
+                if conn is not None:
+                    conn.close()
+            threading.Event().wait(5.0)
+
+    def _dispatch(self, payload: str) -> None:
+        batch = json.loads(payload)
+        pollutant_id = batch["pollutant_id"]
+        with self._lock:
+            targets = [
+                (subscriber, {pair for pair in subscriber.pairs if pair[1] == pollutant_id})
+                for subscriber in self._subscribers.values()
+            ]
+        targets = [(subscriber, pairs) for subscriber, pairs in targets if pairs]
+        if not targets:
+            return
+
+        # 所有订阅者共用一次查询，只取被订阅的 (站点, 污染物)
+        wanted = set().union(*(pairs for _, pairs in targets))
+        with new_session() as db:
+            rows = crud.list_ingested_rows(
+                db, batch["source"], wanted, date.fromisoformat(batch["date"]), batch["hours"]
+            )
+
+        for subscriber, pairs in targets:
+            for (site_id, pollutant), points in rows.items():
+                if (site_id, pollutant) not in pairs:
+                    continue
+                event = {"source": batch["source"], "site_id": site_id, "pollutant_id": pollutant, "points": points}
+                subscriber.loop.call_soon_threadsafe(_offer, subscriber.queue, event)
+
+
+def _offer(queue: asyncio.Queue, event: dict) -> None:
+    # 慢客户端的队列满了就丢弃最旧的增量，客户端可以通过 /api/analysis 重新对齐
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+hub = IngestHub()
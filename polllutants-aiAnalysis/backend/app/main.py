@@ -1,44 +1,113 @@
-from fastapi import FastAPI
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from .config import get_settings
+from .database import dispose_engine
+from .http_cache import CompressionMiddleware
+from .metrics import PROFILED_REQUESTS, REQUEST_LATENCY, STARTUP_SECONDS
+from .profiling import SamplingProfiler
+from .routers.analysis import router as analysis_router
+from .routers.ingest import router as ingest_router
+from .routers.live import router as live_router
+from .routers.metrics import router as metrics_router
+from .routers.olap import router as olap_router
+from .warmup import warm_up
+
+# 导入本模块（含 FastAPI 与各路由模块）的耗时；不包含数据库连接，引擎在第一次使用时才创建
+STARTUP_SECONDS.set(round(time.perf_counter() - _IMPORT_STARTED, 3), "import")
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    if settings.warmup_on_startup:
+        # 在开始接收请求之前完成；数据库不可用时照常启动，由请求自行报错
+        try:
+            summary = await run_in_threadpool(warm_up)
+            STARTUP_SECONDS.set(summary["seconds"], "warmup")
+            logger.info("warmup finished: %s", summary)
+        except Exception:
+            logger.exception("warmup failed, starting cold")
+    yield
+    dispose_engine()
+
+
+def create_app() -> FastAPI:
+    settings = get_settings()
+    app = FastAPI(
+        title="污染物监测分析平台",
+        version="0.1.0",
+        description="FastAPI 后端，提供监测站点、污染物以及站点/TIF对比分析数据接口。",
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # 让前端脚本能读到 ETag 做条件请求
+        expose_headers=["ETag"],
+    )
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compress_min_size)
 
-# 兼容两种启动方式：
-# 1) 作为包：uvicorn app.main:app
-# 2) 作为脚本：python main.py（在 app 目录下执行）
-try:  # 优先按包内相对导入（推荐方式）
-    from .config import get_settings
-    from .routers.analysis import router as analysis_router
-except ImportError:  # 兼容直接 python main.py
-    import os
-    import sys
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        profiling = settings.enable_profiling and request.query_params.get("profile") == "1"
+        started = time.perf_counter()
+        if profiling:
+            with SamplingProfiler(settings.profile_interval_ms / 1000) as profiler:
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        elapsed = time.perf_counter() - started
 
-    CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-    PARENT_DIR = os.path.dirname(CURRENT_DIR)
-    if PARENT_DIR not in sys.path:
-        sys.path.insert(0, PARENT_DIR)
+        # 用路由模板而不是原始路径做标签，避免查询参数/路径参数撑爆标签基数
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.observe(elapsed, request.method, route_path, response.status_code)
+        response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.1f}"
 
-    from app.config import get_settings  # type: ignore
-    from app.routers.analysis import router as analysis_router  # type: ignore
+        if profiling:
+            PROFILED_REQUESTS.inc(route_path)
+            return PlainTextResponse(
+                profiler.render(), headers={"Server-Timing": response.headers["Server-Timing"]}
+            )
+        return response
 
+    app.include_router(analysis_router, prefix="")
+    app.include_router(live_router, prefix="")
+    app.include_router(ingest_router, prefix="")
+    app.include_router(olap_router, prefix="")
+    app.include_router(metrics_router, prefix="")
 
-settings = get_settings()
+    @app.get("/", tags=["health"])
+    def health_check():
+        return {"status": "ok", "message": "pollutants analysis api online"}
 
-app = FastAPI(
-    title="污染物监测分析平台",
-    version="0.1.0",
-    description="FastAPI 后端，提供监测站点、污染物以及站点/TIF对比分析数据接口。",
-)
+    return app
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-app.include_router(analysis_router, prefix="")
+_app = None
 
 
-@app.get("/", tags=["health"])
-def health_check():
-    return {"status": "ok", "message": "pollutants analysis api online"}
\ No newline at end of file
+def __getattr__(name: str):
+    # uvicorn app.main:app 第一次访问 app 时才构建应用；也可用 uvicorn --factory app.main:create_app
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
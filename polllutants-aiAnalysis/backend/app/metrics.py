@@ -0,0 +1,166 @@
+"""进程内指标：请求延迟直方图、SQL 耗时与行数、连接池使用情况。
+
+以 Prometheus 文本格式从 /metrics 暴露；每个 uvicorn worker 各自统计。
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000)
+
+
+class Histogram:
+    """按标签分组的累积直方图。"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: (list(counts), total, n) for labels, (counts, total, n) in self._series.items()}
+        for labels, (counts, total, n) in sorted(snapshot.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{"," if base else ""}le="+Inf"}} {n}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP 请求处理耗时", ("method", "route", "status"), LATENCY_BUCKETS
+)
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL 语句执行耗时", ("statement",), LATENCY_BUCKETS)
+QUERY_ROWS = Histogram("db_query_rows", "SQL 语句返回或影响的行数", ("statement",), ROW_BUCKETS)
+PROFILED_REQUESTS = Counter("http_profiled_requests_total", "启用采样分析的请求数", ("route",))
+SERIES_STORE_READS = Counter("series_store_reads_total", "时间序列存储快速路径的命中 / 回退次数", ("result",))
+SINGLEFLIGHT_REQUESTS = Counter(
+    "singleflight_requests_total", "相同参数并发请求：实际执行 / 合并到进行中计算的次数", ("name", "role")
+)
+STARTUP_SECONDS = Gauge("app_startup_seconds", "worker 启动各阶段耗时：import 为导入应用模块，warmup 为预热", ("phase",))
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    QUERY_LATENCY,
+    QUERY_ROWS,
+    PROFILED_REQUESTS,
+    SERIES_STORE_READS,
+    SINGLEFLIGHT_REQUESTS,
+    STARTUP_SECONDS,
+]
+
+
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip().split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def instrument_engine(engine: Engine) -> None:
+    """挂载 SQLAlchemy 事件，记录每条语句的耗时与行数。"""
+
+    # 开始时间记在本条语句的执行上下文上：语句出错时 after_cursor_execute 不会触发，
+    # 上下文随语句一起丢弃，不会在连接上留下残留的计时
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        kind = _statement_kind(statement)
+        QUERY_LATENCY.observe(elapsed, kind)
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            QUERY_ROWS.observe(cursor.rowcount, kind)
+
+
+def render_pool(engine: Engine) -> list[str]:
+    pool = engine.pool
+    gauges = {
+        "db_pool_size": ("连接池容量", getattr(pool, "size", lambda: 0)()),
+        "db_pool_checked_out": ("已借出的连接数", getattr(pool, "checkedout", lambda: 0)()),
+        "db_pool_checked_in": ("池中空闲连接数", getattr(pool, "checkedin", lambda: 0)()),
+        "db_pool_overflow": ("超出容量的溢出连接数", getattr(pool, "overflow", lambda: 0)()),
+    }
+    lines = []
+    for name, (help_text, value) in gauges.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return lines
+
+
+def render_metrics(engine: Engine) -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    lines += render_pool(engine)
+    return "\n".join(lines) + "\n"
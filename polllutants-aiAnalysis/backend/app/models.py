@@ -1,13 +1,17 @@
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     CheckConstraint,
     Column,
     Date,
+    DateTime,
     Float,
     ForeignKey,
     Integer,
     String,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -54,6 +58,7 @@ class Measurement(Base):
     date = Column(Date, nullable=False)
     hour = Column(Integer, nullable=False)
     value = Column(Float, nullable=True)
+    is_filled = Column(Boolean, nullable=False, default=False)
 
     site = relationship("Site", back_populates="measurements")
     pollutant = relationship("Pollutant", back_populates="measurements")
@@ -82,6 +87,49 @@ class MeasurementTif(Base):
     hour = Column(Integer, nullable=False)
     value = Column(Float, nullable=True)
     data_dir = Column(String, nullable=False)
+    is_filled = Column(Boolean, nullable=False, default=False)
 
     site = relationship("Site", back_populates="tif_measurements")
-    pollutant = relationship("Pollutant", back_populates="tif_measurements")
\ No newline at end of file
+    pollutant = relationship("Pollutant", back_populates="tif_measurements")
+
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    site_id = Column(Integer, primary_key=True)
+    pollutant_id = Column(Integer, primary_key=True)
+    date = Column(Date, primary_key=True)
+    revision = Column(BigInteger, nullable=False, default=1)
+
+
+class Climatology(Base):
+    __tablename__ = "climatology"
+
+    source = Column(String, primary_key=True)
+    pollutant_id = Column(Integer, primary_key=True)
+    dimension = Column(String, primary_key=True)
+    site_id = Column(Integer, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    value_sum = Column(Float, nullable=False)
+    value_sq_sum = Column(Float, nullable=False)
+    value_count = Column(BigInteger, nullable=False)
+
+
+class IngestJobRecord(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    status = Column(String, nullable=False, default="queued")
+    files_total = Column(Integer, nullable=False, default=0)
+    files_done = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(BigInteger, nullable=False, default=0)
+    errors = Column(JSONB, nullable=False, default=list)
+    stages_s = Column(JSONB, nullable=False, default=dict)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -0,0 +1,141 @@
+"""长周期统计（多年均值、站点排名、季节对比）。
+
+这些查询要扫描数年的逐小时数据，放在 PostgreSQL 上会和交互式的 /api/analysis 抢资源。
+这里改用进程内的 DuckDB 扫描 tools/exportParquet.py 导出的 Parquet（按 污染物/年/月 分区），
+只读取用到的列和分区，完全不访问数据库。duckdb 为可选依赖，未安装或尚未导出时返回 503。
+fillGaps.py 的插补值（is_filled）不计入任何统计，否则会虚增有效小时数与超标小时数。
+"""
+import glob
+import os
+import threading
+from datetime import date
+from typing import List, Optional
+
+from .config import get_settings
+
+SEASON_CASE = """
+    CASE WHEN month IN (3, 4, 5) THEN 'spring'
+         WHEN month IN (6, 7, 8) THEN 'summer'
+         WHEN month IN (9, 10, 11) THEN 'autumn'
+         ELSE 'winter' END
+"""
+
+
+class OlapUnavailable(RuntimeError):
+    pass
+
+
+_connection = None
+_connection_lock = threading.Lock()
+
+
+def _cursor():
+    """返回共享内存库上的独立游标；DuckDB 的游标可在各自线程中并发使用。"""
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            try:
+                import duckdb
+            except ImportError:
+                raise OlapUnavailable("未安装 duckdb，统计分析接口不可用")
+            settings = get_settings()
+            _connection = duckdb.connect(config={"threads": settings.olap_threads})
+        return _connection.cursor()
+
+
+def _dataset(source: str, pollutant_id: int) -> str:
+    root = os.path.abspath(get_settings().parquet_dir)
+    pattern = os.path.join(root, source, f"pollutant_id={int(pollutant_id)}", "year=*", "month=*", "*.parquet")
+    if not glob.glob(pattern):
+        raise OlapUnavailable("尚未导出该污染物的 Parquet，请先运行 tools/exportParquet.py")
+    return "read_parquet('{}', hive_partitioning = true)".format(pattern.replace("'", "''"))
+
+
+def _site_filter(site_ids: Optional[List[int]]) -> str:
+    if not site_ids:
+        return ""
+    return f"AND site_id IN ({', '.join(str(int(site_id)) for site_id in site_ids)})"
+
+
+def _fetch(sql: str, params: list) -> list[dict]:
+    cursor = _cursor()
+    try:
+        result = cursor.execute(sql, params)
+        columns = [column[0] for column in result.description]
+        return [dict(zip(columns, row)) for row in result.fetchall()]
+    finally:
+        cursor.close()
+
+
+def annual_means(
+    source: str,
+    pollutant_id: int,
+    start_year: int,
+    end_year: int,
+    site_ids: Optional[List[int]] = None,
+    threshold: float = 200.0,
+) -> list[dict]:
+    """各站点逐年的均值、最大值、有效小时数与超标小时数。"""
+    return _fetch(
+        f"""
+        SELECT site_id, year, AVG(value) AS mean, MAX(value) AS max,
+               COUNT(value) AS hours, COUNT(*) FILTER (WHERE value > ?) AS exceed_hours
+        FROM {_dataset(source, pollutant_id)}
+        WHERE year BETWEEN ? AND ? AND NOT is_filled {_site_filter(site_ids)}
+        GROUP BY site_id, year
+        ORDER BY site_id, year
+        """,
+        [threshold, start_year, end_year],
+    )
+
+
+def site_ranking(
+    source: str,
+    pollutant_id: int,
+    start_date: date,
+    end_date: date,
+    limit: int = 20,
+    threshold: float = 200.0,
+) -> list[dict]:
+    """区间内按均值从高到低的站点排名，附 95 分位与超标小时数。"""
+    return _fetch(
+        f"""
+        SELECT RANK() OVER (ORDER BY AVG(value) DESC) AS rank, site_id,
+               AVG(value) AS mean, QUANTILE_CONT(value, 0.95) AS p95, MAX(value) AS max,
+               COUNT(value) AS hours, COUNT(*) FILTER (WHERE value > ?) AS exceed_hours
+        FROM {_dataset(source, pollutant_id)}
+        WHERE year BETWEEN ? AND ? AND date BETWEEN ? AND ? AND NOT is_filled
+        GROUP BY site_id
+        ORDER BY rank, site_id
+        LIMIT ?
+        """,
+        [threshold, start_date.year, end_date.year, start_date, end_date, limit],
+    )
+
+
+def seasonal_means(
+    source: str,
+    pollutant_id: int,
+    start_year: int,
+    end_year: int,
+    site_ids: Optional[List[int]] = None,
+) -> list[dict]:
+    """
+    逐年各季节（按气象季节：春 3-5 月、夏 6-8 月、秋 9-11 月、冬 12-2 月）的均值，便于跨年对比。
+    冬季跨年，12 月计入次年的冬季：2023 年冬季 = 2022-12 至 2023-02，因此要多读起始年前一年的 12 月。
+    """
+    return _fetch(
+        f"""
+        SELECT season_year AS year, season, AVG(value) AS mean,
+               COUNT(value) AS hours, COUNT(DISTINCT site_id) AS sites
+        FROM (
+            SELECT year + (month = 12)::INTEGER AS season_year, {SEASON_CASE} AS season, month, site_id, value
+            FROM {_dataset(source, pollutant_id)}
+            WHERE year BETWEEN ? AND ? AND NOT is_filled {_site_filter(site_ids)}
+        )
+        WHERE season_year BETWEEN ? AND ?
+        GROUP BY season_year, season
+        ORDER BY season_year, MIN(month % 12)
+        """,
+        [start_year - 1, end_year, start_year, end_year],
+    )
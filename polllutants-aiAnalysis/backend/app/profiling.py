@@ -0,0 +1,43 @@
+"""按请求开启的采样分析器。
+
+FastAPI 的同步路由在线程池中执行，cProfile 这类按线程挂钩的分析器看不到它们，
+因此这里用后台线程定时对所有线程的调用栈采样，输出 collapsed stack 格式
+（每行 "帧;帧;帧 次数"），可直接导入 speedscope 或 flamegraph.pl。
+"""
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                # 空闲的工作线程只停在等待原语上，不计入样本
+                if stack and not stack[0].startswith(("wait ", "select ", "_worker ")):
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def render(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
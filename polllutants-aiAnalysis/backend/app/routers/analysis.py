@@ -1,34 +1,131 @@
 from datetime import date
-from typing import List
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 
-from .. import crud, schemas
-from ..database import get_db
+from .. import crud, http_cache, schemas
+from ..config import get_settings
+from ..database import get_db, new_session
+from ..singleflight import SingleFlight
 
 
 router = APIRouter(prefix="/api", tags=["analysis"])
 
+analysis_flight = SingleFlight("analysis")
+revision_flight = SingleFlight("analysis_revision")
+
 
 @router.get("/sites", response_model=List[schemas.SiteOut])
-def get_sites(db: Session = Depends(get_db)):
-    return crud.list_sites(db)
+def get_sites(request: Request, db: Session = Depends(get_db)):
+    sites = [schemas.SiteOut.model_validate(site) for site in crud.list_sites(db)]
+    return http_cache.json_response(request, http_cache.render_json(sites))
 
 
 @router.get("/pollutants", response_model=List[schemas.PollutantOut])
-def get_pollutants(db: Session = Depends(get_db)):
-    return crud.list_pollutants(db)
+def get_pollutants(request: Request, db: Session = Depends(get_db)):
+    pollutants = [schemas.PollutantOut.model_validate(pollutant) for pollutant in crud.list_pollutants(db)]
+    return http_cache.json_response(request, http_cache.render_json(pollutants))
+
+
+def render_chart_data(site_id: int, pollutant_id: int, start_date: date, end_date: date, revision: str) -> bytes:
+    with new_session() as db:
+        points = crud.build_chart_data(db, site_id, pollutant_id, start_date, end_date, revision)
+    return http_cache.render_json(points)
+
+
+def load_revision(site_id: int, pollutant_id: int, start_date: date, end_date: date) -> str:
+    with new_session() as db:
+        return crud.data_revision(db, site_id, pollutant_id, start_date, end_date)
 
 
 @router.get("/analysis", response_model=List[schemas.ChartDataPoint])
-def get_analysis_data(
+async def get_analysis_data(
+    request: Request,
     site_id: int = Query(..., description="监测站点ID"),
     pollutant_id: int = Query(..., description="污染物ID"),
     start_date: date = Query(..., description="开始日期 YYYY-MM-DD"),
     end_date: date = Query(..., description="结束日期 YYYY-MM-DD"),
-    db: Session = Depends(get_db),
 ):
     schemas.DateRangeIn(start_date=start_date, end_date=end_date)
-    return crud.build_chart_data(db, site_id, pollutant_id, start_date, end_date)
+    # 先读数据版本生成 ETag（在读取数据之前，保证 ETag 不会比响应内容更新），客户端缓存仍有效时直接 304；
+    # 同一时刻的大量相同请求也只查一次版本
+    key = (site_id, pollutant_id, start_date, end_date)
+    revision = await revision_flight.do(key, load_revision, site_id, pollutant_id, start_date, end_date)
+    etag = http_cache.make_etag("analysis", site_id, pollutant_id, start_date, end_date, revision)
+    cache_control = http_cache.cache_control_for_range(end_date)
+    matched = http_cache.matching_etag(request, etag)
+    if matched:
+        return http_cache.not_modified(matched, cache_control)
+
+    # 参数与数据版本都相同的并发请求共享同一次查询和序列化结果；版本不同的请求不会拿到更早开始的查询结果
+    body = await analysis_flight.do(
+        (*key, revision),
+        render_chart_data,
+        site_id,
+        pollutant_id,
+        start_date,
+        end_date,
+        revision,
+    )
+    return http_cache.json_response(request, body, etag=etag, cache_control=cache_control)
+
 
+@router.get("/profiles", response_model=List[schemas.ProfilePoint])
+def get_profiles(
+    request: Request,
+    pollutant_id: int = Query(..., description="污染物ID"),
+    dimension: Literal["hour", "weekday", "month"] = Query(
+        "hour", description="分组维度：hour 日变化（0-23）、weekday 周变化（1-7，1 为周一）、month 年变化（1-12）"
+    ),
+    start_year: Optional[int] = Query(None, description="起始年份（含），缺省为最早"),
+    end_year: Optional[int] = Query(None, description="结束年份（含），缺省为最新"),
+    site_id: Optional[List[int]] = Query(None, description="监测站点ID，可重复；缺省为全部站点"),
+    combine_sites: bool = Query(False, description="是否把所选站点合并为一条曲线"),
+    db: Session = Depends(get_db),
+):
+    if start_year is not None and end_year is not None and end_year < start_year:
+        raise HTTPException(status_code=422, detail="end_year 必须不早于 start_year")
+    profiles = crud.build_profiles(
+        db,
+        pollutant_id,
+        dimension,
+        start_year=start_year,
+        end_year=end_year,
+        site_ids=site_id,
+        combine_sites=combine_sites,
+    )
+    points = [schemas.ProfilePoint(**profile) for profile in profiles]
+    return http_cache.json_response(request, http_cache.render_json(points))
+
+
+@router.get("/events", response_model=List[schemas.EventInterval])
+def get_event_intervals(
+    pollutant_id: int = Query(..., description="污染物ID"),
+    start_date: date = Query(..., description="开始日期 YYYY-MM-DD"),
+    end_date: date = Query(..., description="结束日期 YYYY-MM-DD"),
+    site_id: Optional[List[int]] = Query(None, description="监测站点ID，可重复；缺省为全网"),
+    threshold: float = Query(200.0, description="小时浓度限值，默认 NO2 一小时二级标准 200"),
+    zscore_window: int = Query(24, ge=2, le=24 * 30, description="z-score 滚动窗口（小时）"),
+    zscore_threshold: float = Query(3.0, gt=0, description="|z| 异常阈值"),
+    divergence_threshold: float = Query(40.0, gt=0, description="站点值与 TIF 值的绝对偏差阈值"),
+    min_hours: int = Query(1, ge=1, description="事件最短持续小时数"),
+    db: Session = Depends(get_db),
+):
+    schemas.DateRangeIn(start_date=start_date, end_date=end_date)
+    settings = get_settings()
+    if (end_date - start_date).days + 1 > settings.events_max_days:
+        raise HTTPException(status_code=422, detail=f"日期跨度不能超过 {settings.events_max_days} 天，请分段查询")
+    return crud.build_event_intervals(
+        db,
+        pollutant_id,
+        start_date,
+        end_date,
+        site_ids=site_id,
+        threshold=threshold,
+        zscore_window=zscore_window,
+        zscore_threshold=zscore_threshold,
+        divergence_threshold=divergence_threshold,
+        min_hours=min_hours,
+        site_chunk=settings.events_site_chunk,
+    )
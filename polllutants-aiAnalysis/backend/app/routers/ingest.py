@@ -0,0 +1,78 @@
+import asyncio
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from .. import schemas
+from ..ingest import IngestPathError, IngestUnavailable, manager
+
+
+router = APIRouter(prefix="/api/ingest", tags=["ingest"])
+
+TERMINAL_STATUSES = {"succeeded", "partial", "failed", "cancelled"}
+
+
+def get_job_or_404(job_id: str):
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job
+
+
+@router.post("/jobs", response_model=schemas.IngestJobOut, status_code=status.HTTP_202_ACCEPTED)
+def submit_ingest_job(payload: schemas.IngestJobIn):
+    try:
+        job = manager.submit(payload.kind, payload.path, payload.start_date, payload.end_date)
+    except IngestPathError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"路径不存在: {payload.path}")
+    except IngestUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return job
+
+
+@router.get("/jobs", response_model=List[schemas.IngestJobOut])
+def list_ingest_jobs():
+    return manager.all_jobs()
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJobOut)
+def get_ingest_job(job_id: str):
+    return get_job_or_404(job_id)
+
+
+@router.delete("/jobs/{job_id}", response_model=schemas.IngestJobOut)
+def cancel_ingest_job(job_id: str):
+    get_job_or_404(job_id)
+    return manager.cancel(job_id)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_ingest_progress(job_id: str):
+    job = await run_in_threadpool(get_job_or_404, job_id)
+
+    async def events():
+        last_progress = None
+        snapshot = job
+        while snapshot is not None:
+            snapshot = jsonable_encoder(snapshot)
+            progress = (snapshot["status"], snapshot["files_done"], len(snapshot["errors"]))
+            if progress != last_progress:
+                last_progress = progress
+                yield f"event: progress\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            if snapshot["status"] in TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(0.5)
+            # 任务状态在数据库中，任务由哪个 worker 执行都能看到进度；已被清理则结束推送
+            snapshot = await run_in_threadpool(manager.get, job_id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
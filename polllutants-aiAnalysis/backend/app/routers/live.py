@@ -0,0 +1,54 @@
+import asyncio
+import json
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from ..config import get_settings
+from ..live import hub
+
+
+router = APIRouter(prefix="/api", tags=["live"])
+
+
+def parse_pairs(values: List[str]) -> set[tuple[int, int]]:
+    pairs = set()
+    for value in values:
+        try:
+            site_id, pollutant_id = value.split(":")
+            pairs.add((int(site_id), int(pollutant_id)))
+        except ValueError:
+            raise HTTPException(status_code=422, detail=f"pair 格式应为 站点ID:污染物ID，收到 {value!r}")
+    return pairs
+
+
+@router.get("/stream")
+async def stream_ingested_hours(
+    request: Request,
+    pair: List[str] = Query(..., description="订阅的 站点ID:污染物ID，可重复，如 pair=28:1&pair=29:1"),
+):
+    pairs = parse_pairs(pair)
+    keepalive = get_settings().stream_keepalive_seconds
+    subscriber = hub.subscribe(pairs)
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: ingested\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
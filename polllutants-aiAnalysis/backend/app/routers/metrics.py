@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..database import get_engine
+from ..metrics import render_metrics
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(
+        render_metrics(get_engine()), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,58 @@
+from datetime import date
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from .. import olap, schemas
+
+
+router = APIRouter(prefix="/api/olap", tags=["olap"])
+
+Source = Literal["station", "tif"]
+
+
+def run_or_503(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except olap.OlapUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@router.get("/annual", response_model=List[schemas.AnnualMean])
+def get_annual_means(
+    pollutant_id: int = Query(..., description="污染物ID"),
+    start_year: int = Query(..., description="起始年份"),
+    end_year: int = Query(..., description="结束年份"),
+    source: Source = Query("station", description="数据源：station 站点 / tif 栅格"),
+    site_id: Optional[List[int]] = Query(None, description="监测站点ID，可重复；缺省为全部站点"),
+    threshold: float = Query(200.0, description="超标小时的浓度限值"),
+):
+    if end_year < start_year:
+        raise HTTPException(status_code=422, detail="end_year 必须不早于 start_year")
+    return run_or_503(olap.annual_means, source, pollutant_id, start_year, end_year, site_id, threshold)
+
+
+@router.get("/ranking", response_model=List[schemas.SiteRank])
+def get_site_ranking(
+    pollutant_id: int = Query(..., description="污染物ID"),
+    start_date: date = Query(..., description="开始日期 YYYY-MM-DD"),
+    end_date: date = Query(..., description="结束日期 YYYY-MM-DD"),
+    source: Source = Query("station", description="数据源：station 站点 / tif 栅格"),
+    limit: int = Query(20, ge=1, le=1000, description="返回的站点数"),
+    threshold: float = Query(200.0, description="超标小时的浓度限值"),
+):
+    schemas.DateRangeIn(start_date=start_date, end_date=end_date)
+    return run_or_503(olap.site_ranking, source, pollutant_id, start_date, end_date, limit, threshold)
+
+
+@router.get("/seasonal", response_model=List[schemas.SeasonalMean])
+def get_seasonal_means(
+    pollutant_id: int = Query(..., description="污染物ID"),
+    start_year: int = Query(..., description="起始年份"),
+    end_year: int = Query(..., description="结束年份"),
+    source: Source = Query("station", description="数据源：station 站点 / tif 栅格"),
+    site_id: Optional[List[int]] = Query(None, description="监测站点ID，可重复；缺省为全部站点"),
+):
+    if end_year < start_year:
+        raise HTTPException(status_code=422, detail="end_year 必须不早于 start_year")
+    return run_or_503(olap.seasonal_means, source, pollutant_id, start_year, end_year, site_id)
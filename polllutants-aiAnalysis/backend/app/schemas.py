@@ -1,5 +1,5 @@
-from datetime import date
-from typing import Optional
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, field_validator
 
@@ -28,6 +28,20 @@ class ChartDataPoint(BaseModel):
     timestamp: str
     stationValue: Optional[float] = None
     tifValue: Optional[float] = None
+    # 该小时的值是否为 tools/fillGaps.py 插补的估计值
+    stationFilled: bool = False
+    tifFilled: bool = False
+
+
+class EventInterval(BaseModel):
+    site_id: int
+    pollutant_id: int
+    event_type: str
+    source: str
+    start: str
+    end: str
+    hours: int
+    peak_value: Optional[float] = None
 
 
 class DateRangeIn(BaseModel):
@@ -42,3 +56,74 @@ class DateRangeIn(BaseModel):
             raise ValueError("end_date 必须晚于 start_date")
         return end_date
 
+
+class IngestJobIn(BaseModel):
+    kind: Literal["csv", "tif"]
+    path: str
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    @field_validator("end_date")
+    @classmethod
+    def validate_range(cls, end_date: Optional[date], info):
+        start_date = info.data.get("start_date")
+        if start_date and end_date and end_date < start_date:
+            raise ValueError("end_date 必须晚于 start_date")
+        return end_date
+
+
+class IngestJobOut(BaseModel):
+    id: str
+    kind: str
+    path: str
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    status: str
+    files_total: int
+    files_done: int
+    rows: int
+    rows_per_s: Optional[float] = None
+    files_per_s: Optional[float] = None
+    stages_s: Dict[str, float] = {}
+    errors: List[str] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class AnnualMean(BaseModel):
+    site_id: int
+    year: int
+    mean: Optional[float] = None
+    max: Optional[float] = None
+    hours: int
+    exceed_hours: int
+
+
+class SiteRank(BaseModel):
+    rank: int
+    site_id: int
+    mean: Optional[float] = None
+    p95: Optional[float] = None
+    max: Optional[float] = None
+    hours: int
+    exceed_hours: int
+
+
+class SeasonalMean(BaseModel):
+    year: int
+    season: Literal["spring", "summer", "autumn", "winter"]
+    mean: Optional[float] = None
+    hours: int
+    sites: int
+
+
+class ProfilePoint(BaseModel):
+    site_id: Optional[int] = None
+    bucket: int
+    stationMean: Optional[float] = None
+    stationStd: Optional[float] = None
+    stationCount: int = 0
+    tifMean: Optional[float] = None
+    tifStd: Optional[float] = None
+    tifCount: int = 0
@@ -0,0 +1,25 @@
+"""/api/analysis 的快速路径：只读映射 tools/seriesStore.py 维护的逐小时时间序列。
+
+存储按 (数据源, 污染物, 年) 分片，行号即 site_id，一次区间查询就是一次切片；
+所有 worker 进程映射同一批文件，共享操作系统页缓存。尚未与数据库对齐的区间返回 None，
+调用方回退到 SQL。
+"""
+import os
+import threading
+
+from .config import get_settings
+from .ingest import load_tool
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    series_store_dir = get_settings().series_store_dir
+    if not series_store_dir:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = load_tool("seriesStore").SeriesStore(os.path.abspath(series_store_dir))
+    return _store
@@ -0,0 +1,37 @@
+"""相同参数的并发请求合并（single-flight）。
+
+大屏刷新时许多浏览器会在同一时刻请求完全相同的数据。同一 worker 进程内，
+键相同的请求只在线程池中计算一次，其余请求在事件循环上等待同一个结果，不占用线程和数据库连接。
+计算在独立的任务中进行：个别客户端断开只取消它自己的等待，不影响其他请求拿到结果。
+"""
+import asyncio
+from typing import Any, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import SINGLEFLIGHT_REQUESTS
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        # 只在事件循环线程中读写，不需要加锁
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[..., Any], *args) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(func, *args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            SINGLEFLIGHT_REQUESTS.inc(self.name, "executed")
+        else:
+            SINGLEFLIGHT_REQUESTS.inc(self.name, "coalesced")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有等待方都已断开时也要取走异常，避免 "Task exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,58 @@
+"""worker 启动预热。
+
+按负载增减 uvicorn worker 时，新进程的第一批请求要建立数据库连接、读冷的数据库缓冲区和
+时间序列存储的页缓存，恰好在最需要容量的时候最慢。lifespan 启动阶段（开始接收请求之前）在这里
+先查询站点/污染物目录，再并发预取每个 站点/污染物 最近几天的分析数据和数据版本，走的都是
+接口实际使用的代码路径。预热失败或超时只记录日志，不影响 worker 启动。
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from . import crud, http_cache, schemas
+from .config import get_settings
+from .database import new_session
+
+logger = logging.getLogger(__name__)
+
+
+def warm_pair(site_id: int, pollutant_id: int, days: int) -> bool:
+    with new_session() as db:
+        end_date = crud.latest_date(db, site_id, pollutant_id)
+        if end_date is None:
+            return False
+        start_date = end_date - timedelta(days=days - 1)
+        revision = crud.data_revision(db, site_id, pollutant_id, start_date, end_date)
+        http_cache.render_json(crud.build_chart_data(db, site_id, pollutant_id, start_date, end_date, revision))
+    return True
+
+
+def warm_up() -> dict:
+    settings = get_settings()
+    started = time.perf_counter()
+    with new_session() as db:
+        sites = [schemas.SiteOut.model_validate(site) for site in crud.list_sites(db)]
+        pollutants = [schemas.PollutantOut.model_validate(pollutant) for pollutant in crud.list_pollutants(db)]
+    http_cache.render_json(sites)
+    http_cache.render_json(pollutants)
+
+    pairs = [(site.site_id, pollutant.pollutant_id) for site in sites for pollutant in pollutants]
+    executor = ThreadPoolExecutor(max_workers=max(settings.warmup_concurrency, 1), thread_name_prefix="warmup")
+    futures = [executor.submit(warm_pair, site_id, pollutant_id, settings.warmup_days) for site_id, pollutant_id in pairs]
+    done, pending = wait(futures, timeout=settings.warmup_timeout_seconds)
+    # 超时后不再等待：未开始的取消，正在执行的在后台自然结束
+    for future in pending:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    failed = [future.exception() for future in done if future.exception() is not None]
+    if failed:
+        logger.warning("warmup: %d of %d windows failed, first error: %r", len(failed), len(pairs), failed[0])
+    return {
+        "sites": len(sites),
+        "pollutants": len(pollutants),
+        "windows": sum(1 for future in done if future.exception() is None and future.result()),
+        "timed_out": len(pending),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
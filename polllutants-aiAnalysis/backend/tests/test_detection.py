@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.detection import HourlyGrid, detect_events, find_runs, rolling_zscore, run_peaks
+
+NAN = np.nan
+
+
+def test_find_runs_per_row():
+    mask = np.array(
+        [
+            [True, True, False, True, False],
+            [False, False, False, False, False],
+            [True, True, True, True, True],
+        ]
+    )
+    rows, starts, ends = find_runs(mask)
+    assert rows.tolist() == [0, 0, 2]
+    assert starts.tolist() == [0, 3, 0]
+    assert ends.tolist() == [2, 4, 5]
+
+
+def test_find_runs_min_length():
+    rows, starts, ends = find_runs([[True, False, True, True, True, False, True, True]], min_length=2)
+    assert list(zip(rows.tolist(), starts.tolist(), ends.tolist())) == [(0, 2, 5), (0, 6, 8)]
+
+
+def test_run_peaks_ignores_nan():
+    values = np.array([[1.0, 5.0, NAN, 2.0], [NAN, NAN, 7.0, 3.0]])
+    rows, starts, ends = np.array([0, 0, 1]), np.array([0, 2, 0]), np.array([2, 4, 2])
+    peaks = run_peaks(values, rows, starts, ends)
+    assert peaks[:2].tolist() == [5.0, 2.0]
+    # 区间内全部为 NaN 时峰值为 NaN
+    assert np.isnan(peaks[2])
+
+
+def test_run_peaks_empty():
+    assert run_peaks(np.zeros((1, 3)), np.empty(0, int), np.empty(0, int), np.empty(0, int)).size == 0
+
+
+def test_rolling_zscore_matches_population_std():
+    values = np.array([[10.0, 12.0, NAN, 14.0, 11.0, 30.0]])
+    z = rolling_zscore(values, window=4, min_periods=2)
+
+    # 第 5 个小时（30.0）的基准为前 4 小时中的有效值 12、14、11
+    baseline = np.array([12.0, 14.0, 11.0])
+    assert z[0, 5] == pytest.approx((30.0 - baseline.mean()) / baseline.std(ddof=0))
+    assert z[0, 3] == pytest.approx((14.0 - 11.0) / np.array([10.0, 12.0]).std(ddof=0))
+
+
+def test_rolling_zscore_masks_short_history_flat_baseline_and_missing():
+    z = rolling_zscore(np.array([[5.0, 5.0, 5.0, 9.0, NAN]]), window=3, min_periods=2)
+    # 0、1 时样本不足，2、3 时基准标准差为 0，4 时本身缺测
+    assert np.isnan(z).all()
+
+
+def test_detect_events_three_types():
+    station = np.array([[10.0, 10.0, 11.0, 10.0, 250.0, 260.0, 10.0, 10.0]])
+    tif = np.array([[10.0, 10.0, 11.0, 10.0, 200.0, 190.0, 10.0, 60.0]])
+    grid = HourlyGrid(site_ids=np.array([28]), start_ordinal=0, station=station, tif=tif)
+
+    events = detect_events(grid, threshold=200.0, zscore_window=4, zscore_threshold=3.0, divergence_threshold=40.0)
+    found = {(e["event_type"], e["source"], e["start_hour"], e["end_hour"]) for e in events}
+
+    assert ("exceedance", "station", 4, 6) in found
+    assert ("divergence", "station-tif", 4, 6) in found
+    assert ("divergence", "station-tif", 7, 8) in found
+    assert ("anomaly", "station", 4, 5) in found
+    assert not any(e["event_type"] == "exceedance" and e["source"] == "tif" for e in events)
+    assert all(e["site_id"] == 28 for e in events)
+    assert [e["start_hour"] for e in events] == sorted(e["start_hour"] for e in events)
+
+
+def test_detect_events_min_hours():
+    station = np.array([[250.0, 10.0, 250.0, 250.0]])
+    grid = HourlyGrid(site_ids=np.array([1]), start_ordinal=0, station=station, tif=np.full_like(station, NAN))
+    events = detect_events(
+        grid, threshold=200.0, zscore_window=24, zscore_threshold=3.0, divergence_threshold=40.0, min_hours=2
+    )
+    assert [(e["start_hour"], e["end_hour"], e["peak_value"]) for e in events] == [(2, 4, 250.0)]
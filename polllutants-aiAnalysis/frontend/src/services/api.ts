@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { Site, Pollutant, ChartDataPoint, DateRange } from '../types';
+import type { Site, Pollutant, ChartDataPoint, DateRange, IngestedDelta } from '../types';
 
 const apiClient = axios.create({
   baseURL: import.meta.env.VITE_API_BASE ?? 'http://localhost:8000/api',
@@ -32,3 +32,16 @@ export const fetchAnalysis = async (
   return data;
 };
 
+// 订阅新入库的小时数据（SSE），只推送所订阅 站点/污染物 的增量；返回取消订阅函数
+export const subscribeIngested = (
+  pairs: Array<[number, number]>,
+  onDelta: (delta: IngestedDelta) => void
+): (() => void) => {
+  const params = new URLSearchParams();
+  pairs.forEach(([siteId, pollutantId]) => params.append('pair', `${siteId}:${pollutantId}`));
+  const source = new EventSource(`${apiClient.defaults.baseURL}/stream?${params.toString()}`);
+  source.addEventListener('ingested', (event) => {
+    onDelta(JSON.parse((event as MessageEvent<string>).data) as IngestedDelta);
+  });
+  return () => source.close();
+};
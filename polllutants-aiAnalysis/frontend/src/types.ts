@@ -16,6 +16,24 @@ export interface ChartDataPoint {
   timestamp: string;
   stationValue: number | null;
   tifValue: number | null;
+  // 是否为缺测插补（tools/fillGaps.py）的估计值
+  stationFilled: boolean;
+  tifFilled: boolean;
+}
+
+export interface IngestedPoint {
+  date: string;
+  hour: number;
+  timestamp: string;
+  value: number | null;
+  filled: boolean;
+}
+
+export interface IngestedDelta {
+  source: 'station' | 'tif';
+  site_id: number;
+  pollutant_id: number;
+  points: IngestedPoint[];
 }
 
 export interface DateRange {
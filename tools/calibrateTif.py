@@ -0,0 +1,312 @@
+import os
+import glob
+import argparse
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+import rasterio
+from psycopg2 import extras
+from importTifMeasurements import TIF_BASE_PATH, get_db_connection, load_pollutant_mapping, parse_tif_path
+
+# ================= 配置部分 =================
+# 校正后 GeoTIFF 的输出根目录，保持与 TIF_BASE_PATH 相同的相对目录结构
+CORRECTED_TIF_PATH = r"../database/corrected/NO2/"
+
+# 站点配对小时数少于该值时，不单独拟合站点系数，改用区域系数
+MIN_PAIRS = 48
+# 栅格校正并行进程数，默认 CPU 核数
+WORKERS = os.cpu_count() or 4
+# 每批最多提交的栅格数量，避免一次性把成千上万个任务压进进程池
+BATCH_SIZE = WORKERS * 8
+
+REGION_SITE_ID = 0  # calibration_coefficients 中 site_id = 0 表示区域系数
+
+# 增量拟合从高水位（已配对的最新日期）往前回看的天数，覆盖站点数据晚于栅格到达、插补值被实测值替换等迟到的配对；
+# 更早的补录用 --full 完整扫描一次
+LOOKBACK_DAYS = 7
+
+
+# ===========================================
+
+# 增量拟合：只把尚未记录在 calibration_pairs 中的新配对小时累加进充分统计量。
+# 只用两边都是实测值的小时：fillGaps 插补的值不参与拟合，之后被实测值覆盖时再作为新配对计入。
+# 每个污染物只扫描 scan_from 之后的 TIF 小时（为空时完整扫描），不再每次连接两张全表。
+NEW_PAIR_STATS_QUERY = """
+WITH new_pairs AS (
+    INSERT INTO calibration_pairs (site_id, pollutant_id, date, hour)
+    SELECT t.site_id, t.pollutant_id, t.date, t.hour
+    FROM measurements_tif t
+    JOIN measurements m
+        ON m.site_id = t.site_id AND m.pollutant_id = t.pollutant_id
+       AND m.date = t.date AND m.hour = t.hour
+    WHERE t.pollutant_id = %(pollutant_id)s
+      AND (%(scan_from)s::date IS NULL OR t.date >= %(scan_from)s::date)
+      AND t.value IS NOT NULL AND m.value IS NOT NULL AND NOT t.is_filled AND NOT m.is_filled
+    ON CONFLICT DO NOTHING
+    RETURNING site_id, pollutant_id, date, hour
+)
+SELECT p.pollutant_id, p.site_id,
+       COUNT(*), SUM(t.value), SUM(m.value), SUM(t.value * t.value), SUM(t.value * m.value), MAX(p.date)
+FROM new_pairs p
+JOIN measurements_tif t
+    ON t.site_id = p.site_id AND t.pollutant_id = p.pollutant_id AND t.date = p.date AND t.hour = p.hour
+JOIN measurements m
+    ON m.site_id = p.site_id AND m.pollutant_id = p.pollutant_id AND m.date = p.date AND m.hour = p.hour
+GROUP BY p.pollutant_id, p.site_id
+"""
+
+PAIRED_THROUGH_QUERY = """
+SELECT p.pollutant_id, s.paired_through
+FROM pollutants p
+LEFT JOIN calibration_state s ON s.pollutant_id = p.pollutant_id
+ORDER BY p.pollutant_id
+"""
+
+UPSERT_STATE_QUERY = """
+INSERT INTO calibration_state (pollutant_id, paired_through)
+VALUES (%s, %s)
+ON CONFLICT (pollutant_id) DO UPDATE SET
+    paired_through = GREATEST(calibration_state.paired_through, EXCLUDED.paired_through)
+"""
+
+UPSERT_COEFFICIENT_QUERY = """
+INSERT INTO calibration_coefficients
+    (pollutant_id, site_id, n_pairs, sum_x, sum_y, sum_xx, sum_xy, slope, intercept, fit_version)
+VALUES %s
+ON CONFLICT (pollutant_id, site_id) DO UPDATE SET
+    n_pairs = EXCLUDED.n_pairs, sum_x = EXCLUDED.sum_x, sum_y = EXCLUDED.sum_y,
+    sum_xx = EXCLUDED.sum_xx, sum_xy = EXCLUDED.sum_xy,
+    slope = EXCLUDED.slope, intercept = EXCLUDED.intercept,
+    fit_version = calibration_coefficients.fit_version + 1
+"""
+
+# 站点系数样本足够时优先使用，否则回退到区域系数；只改写系数版本已变化的行。
+# 逐污染物执行：本次系数有变化的污染物扫描全部小时（scan_from 为空），其余只扫描 scan_from 之后新到的 TIF 小时。
+# 插补值不做校正：is_filled 的小时不写入校正值表，之后被实测值覆盖时再按新到的小时写入。
+APPLY_VALUES_QUERY = """
+INSERT INTO measurements_tif_corrected
+    (distinct_id, site_id, pollutant_id, date, hour, value, raw_value, coefficient_site_id, fit_version)
+SELECT t.distinct_id, t.site_id, t.pollutant_id, t.date, t.hour,
+       ROUND((c.slope * t.value + c.intercept)::numeric, 2)::double precision,
+       t.value, c.site_id, c.fit_version
+FROM measurements_tif t
+JOIN LATERAL (
+    SELECT site_id, slope, intercept, fit_version
+    FROM calibration_coefficients c
+    WHERE c.pollutant_id = t.pollutant_id
+      AND (c.site_id = %(region)s OR (c.site_id = t.site_id AND c.n_pairs >= %(min_pairs)s))
+    ORDER BY c.site_id = %(region)s
+    LIMIT 1
+) c ON TRUE
+LEFT JOIN measurements_tif_corrected x ON x.distinct_id = t.distinct_id
+WHERE t.pollutant_id = %(pollutant_id)s
+  AND (%(scan_from)s::date IS NULL OR t.date >= %(scan_from)s::date)
+  AND t.value IS NOT NULL AND NOT t.is_filled
+  AND (x.distinct_id IS NULL OR x.coefficient_site_id <> c.site_id OR x.fit_version <> c.fit_version)
+ON CONFLICT (distinct_id) DO UPDATE SET
+    value = EXCLUDED.value, raw_value = EXCLUDED.raw_value,
+    coefficient_site_id = EXCLUDED.coefficient_site_id, fit_version = EXCLUDED.fit_version
+"""
+
+
+# ================= 函数定义 =================
+def solve_coefficients(stats):
+    """
+    由充分统计量批量求解最小二乘 station = slope * tif + intercept。
+    stats: 形如 [k, 5] 的数组，列依次为 n, Σx, Σy, Σx², Σxy。
+    样本不足或 tif 值无方差时退化为恒等校正 (1, 0)。
+    """
+    n, sx, sy, sxx, sxy = np.asarray(stats, dtype=float).T
+    denom = n * sxx - sx * sx
+    ok = (n >= 2) & (np.abs(denom) > 1e-9)
+    safe_denom = np.where(ok, denom, 1.0)
+    safe_n = np.where(n > 0, n, 1.0)
+    slope = np.where(ok, (n * sxy - sx * sy) / safe_denom, 1.0)
+    intercept = np.where(ok, (sy - slope * sx) / safe_n, 0.0)
+    return slope, intercept
+
+
+def load_scan_from(conn, lookback_days=LOOKBACK_DAYS, full=False):
+    """返回 {pollutant_id: scan_from}：高水位往前 lookback_days 天；没有高水位或 full 时为 None（完整扫描）。"""
+    with conn.cursor() as cur:
+        cur.execute(PAIRED_THROUGH_QUERY)
+        return {
+            pollutant_id: None if full or paired_through is None else paired_through - timedelta(days=lookback_days)
+            for pollutant_id, paired_through in cur.fetchall()
+        }
+
+
+def refit_coefficients(conn, scan_from):
+    """
+    把新配对小时累加进现有统计量，重新求解并写回。
+    每个污染物只扫描 scan_from 之后的小时。返回 (新增配对小时数, 系数有变化的污染物集合)。
+    """
+    with conn.cursor() as cur:
+        increments = []
+        for pollutant_id, since in scan_from.items():
+            cur.execute(NEW_PAIR_STATS_QUERY, {'pollutant_id': pollutant_id, 'scan_from': since})
+            rows = cur.fetchall()
+            if rows:
+                # 高水位与新配对在同一事务中提交，中途失败时一起回滚
+                cur.execute(UPSERT_STATE_QUERY, (pollutant_id, max(row[-1] for row in rows)))
+                increments += [row[:-1] for row in rows]
+        if not increments:
+            return 0, set()
+
+        cur.execute(
+            "SELECT pollutant_id, site_id, n_pairs, sum_x, sum_y, sum_xx, sum_xy FROM calibration_coefficients"
+        )
+        totals = {(row[0], row[1]): np.array(row[2:], dtype=float) for row in cur.fetchall()}
+
+        changed = set()
+        for pollutant_id, site_id, *delta in increments:
+            delta = np.array(delta, dtype=float)
+            for key in ((pollutant_id, site_id), (pollutant_id, REGION_SITE_ID)):
+                totals[key] = totals.get(key, np.zeros(5)) + delta
+                changed.add(key)
+
+        keys = sorted(changed)
+        stats = np.vstack([totals[key] for key in keys])
+        slope, intercept = solve_coefficients(stats)
+
+        rows = [
+            (pollutant_id, site_id, int(s[0]), *map(float, s[1:]), float(a), float(b), 1)
+            for (pollutant_id, site_id), s, a, b in zip(keys, stats, slope, intercept)
+        ]
+        extras.execute_values(cur, UPSERT_COEFFICIENT_QUERY, rows)
+    conn.commit()
+    return int(sum(row[2] for row in increments)), {pollutant_id for pollutant_id, _ in changed}
+
+
+def apply_corrected_values(conn, scan_from, changed_pollutants):
+    """
+    逐污染物集合运算写入/刷新 measurements_tif_corrected：系数有变化的污染物全部重算，
+    其余只补上 scan_from 之后新到的小时，不再每次扫描整张 measurements_tif。
+    """
+    updated = 0
+    with conn.cursor() as cur:
+        for pollutant_id, since in scan_from.items():
+            cur.execute(APPLY_VALUES_QUERY, {
+                'region': REGION_SITE_ID, 'min_pairs': MIN_PAIRS, 'pollutant_id': pollutant_id,
+                'scan_from': None if pollutant_id in changed_pollutants else since,
+            })
+            updated += cur.rowcount
+    conn.commit()
+    return updated
+
+
+def correct_raster(task):
+    """
+    在工作进程中校正单个栅格：按块流式读取，对整块像素做向量化线性变换。
+    输出文件带 FIT_VERSION 标签，版本未变化时直接跳过。
+    """
+    src_path, dst_path, slope, intercept, fit_version = task
+    if os.path.exists(dst_path):
+        with rasterio.open(dst_path) as existing:
+            if existing.tags().get('FIT_VERSION') == str(fit_version):
+                return 'skipped'
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    with rasterio.open(src_path) as src:
+        profile = src.profile.copy()
+        profile.update(dtype='float32', compress='deflate')
+        nodata = src.nodata
+        with rasterio.open(dst_path, 'w', **profile) as dst:
+            dst.update_tags(**src.tags())
+            dst.update_tags(CALIBRATION_SLOPE=slope, CALIBRATION_INTERCEPT=intercept, FIT_VERSION=fit_version)
+            for band in range(1, src.count + 1):
+                dst.update_tags(band, **src.tags(band))
+                if src.descriptions[band - 1]:
+                    dst.set_band_description(band, src.descriptions[band - 1])
+            for _, window in src.block_windows(1):
+                data = src.read(window=window).astype('float32')
+                valid = ~np.isnan(data)
+                if nodata is not None and not np.isnan(nodata):
+                    valid &= data != nodata
+                corrected = np.where(valid, data * slope + intercept, data)
+                dst.write(corrected.astype('float32'), window=window)
+    return 'written'
+
+
+def iter_raster_tasks(coefficients, pollutant_map):
+    """惰性遍历 TIF_BASE_PATH，为每个可识别的栅格生成校正任务。"""
+    for tif_path in glob.iglob(os.path.join(TIF_BASE_PATH, "**", "*.tif"), recursive=True):
+        parsed = parse_tif_path(os.path.normpath(tif_path), pollutant_map)
+        if not parsed or parsed['pollutant_id'] not in coefficients:
+            continue
+        slope, intercept, fit_version = coefficients[parsed['pollutant_id']]
+        relative = os.path.relpath(tif_path, TIF_BASE_PATH)
+        yield tif_path, os.path.join(CORRECTED_TIF_PATH, relative), slope, intercept, fit_version
+
+
+def correct_rasters(conn, pollutant_map, workers):
+    """以有界批次把栅格任务流式地交给进程池，内存占用与栅格总数无关。"""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT pollutant_id, slope, intercept, fit_version FROM calibration_coefficients WHERE site_id = %s",
+            (REGION_SITE_ID,)
+        )
+        coefficients = {row[0]: row[1:] for row in cur.fetchall()}
+    if not coefficients:
+        print("⚠️ 尚无区域校正系数，跳过栅格校正。")
+        return {}
+
+    counts = {'written': 0, 'skipped': 0, 'failed': 0}
+    tasks = iter_raster_tasks(coefficients, pollutant_map)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(tasks, BATCH_SIZE))
+            if not batch:
+                break
+            futures = [(task[0], executor.submit(correct_raster, task)) for task in batch]
+            for src_path, future in futures:
+                try:
+                    counts[future.result()] += 1
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(f"❌ 栅格校正失败 ({os.path.basename(src_path)}): {e}")
+            print(f"ℹ️ 已处理 {sum(counts.values())} 个栅格 ...")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基于站点数据增量拟合 TIF 校正系数，并批量输出校正值与校正栅格")
+    parser.add_argument('--skip-rasters', action='store_true', help="只拟合系数并更新校正值表，不输出栅格")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="栅格校正并行进程数")
+    parser.add_argument('--lookback-days', type=int, default=LOOKBACK_DAYS, help="增量拟合从高水位往前回看的天数")
+    parser.add_argument('--full', action='store_true', help="忽略高水位，完整扫描全部配对小时（补录较早数据后使用）")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            pollutant_map = load_pollutant_mapping(cur)
+
+        # 高水位在拟合前读取：拟合会推进高水位，校正值表要用本次运行之前的位置判断哪些小时是新到的
+        scan_from = load_scan_from(conn, args.lookback_days, args.full)
+        new_pairs, changed_pollutants = refit_coefficients(conn, scan_from)
+        print(f"✅ 新增 {new_pairs} 个配对小时参与拟合。")
+
+        updated = apply_corrected_values(conn, scan_from, changed_pollutants)
+        print(f"✅ measurements_tif_corrected 写入/刷新 {updated} 条记录。")
+
+        if not args.skip_rasters:
+            counts = correct_rasters(conn, pollutant_map, args.workers)
+            if counts:
+                print(f"✅ 栅格校正完成：写出 {counts['written']}，跳过 {counts['skipped']}，失败 {counts['failed']}。")
+
+        print("🎉 校正流程结束。")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ 校正流程出错，未提交的操作已回滚: {type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import re
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import rasterio
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy as copy_raster
+from importTifMeasurements import TIF_BASE_PATH
+
+# ================= 配置部分 =================
+# 合并后的按天 COG 输出根目录，结构为 <污染物>/<YYYY_MM_DD>.tif，每个文件 24 个波段（波段 n 对应 n-1 时）
+COG_TIF_PATH = r"../database/cog/"
+
+# COG 内部瓦片边长（像素）
+BLOCK_SIZE = 256
+# 压缩方式；浮点栅格配合 PREDICTOR=3 压缩率更高
+COMPRESS = 'DEFLATE'
+# 并行进程数，默认 CPU 核数
+WORKERS = os.cpu_count() or 4
+
+HOURLY_PATTERN = re.compile(r'[/\\](\w+)[/\\](\d{4}_\d{2}_\d{2})[/\\](\d{2})\.tif$', re.IGNORECASE)
+
+
+# ===========================================
+
+# ================= 函数定义 =================
+def group_hourly_files(source_dir):
+    """
+    扫描逐小时布局 <污染物>/<YYYY_MM_DD>/<HH>.tif，按 (污染物, 日期) 分组。
+    返回 {(污染物, 日期): {小时: 路径}}，只依赖目录结构，不需要连接数据库。
+    """
+    days = {}
+    for tif_path in glob.iglob(os.path.join(source_dir, "**", "*.tif"), recursive=True):
+        match = HOURLY_PATTERN.search(os.path.normpath(tif_path))
+        if not match:
+            continue
+        pollutant_name, date_str, hour_str = match.groups()
+        hour = int(hour_str)
+        if hour < 24:
+            days.setdefault((pollutant_name.upper(), date_str), {})[hour] = tif_path
+    return days
+
+
+def is_up_to_date(out_path, hour_paths):
+    """输出已存在且比当天所有逐小时文件都新时，无需重新合并。"""
+    if not os.path.exists(out_path):
+        return False
+    newest_source = max(os.path.getmtime(path) for path in hour_paths.values())
+    return os.path.getmtime(out_path) >= newest_source
+
+
+def compact_day(task):
+    """
+    在工作进程中把一天的逐小时栅格合并为一个 24 波段的 Cloud-Optimized GeoTIFF。
+    先逐小时写入内存中的分块 GTiff，再由 GDAL COG 驱动一次性生成内部金字塔并按 COG 顺序写出。
+    缺失的小时整波段为 NoData，并打上 MISSING=TRUE 标签，读取方据此跳过。
+    """
+    pollutant_name, date_str, hour_paths, out_path, force = task
+    if not force and is_up_to_date(out_path, hour_paths):
+        return 'skipped', date_str, []
+
+    first_hour = min(hour_paths)
+    with rasterio.open(hour_paths[first_hour]) as src:
+        reference = src.profile.copy()
+
+    profile = reference.copy()
+    profile.update(driver='GTiff', count=24, dtype='float32', nodata=float('nan'),
+                   tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE)
+    profile.pop('compress', None)
+    profile.pop('interleave', None)
+
+    skipped_hours = []
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dst:
+            dst.update_tags(POLLUTANT=pollutant_name, DATE=date_str.replace('_', '-'), LAYOUT='DAILY_24H')
+            for hour in range(24):
+                band = hour + 1
+                dst.set_band_description(band, f"{hour:02d}:00")
+                path = hour_paths.get(hour)
+                data = None
+                if path:
+                    with rasterio.open(path) as src:
+                        # 栅格网格不一致的小时无法放进同一个多波段文件，按缺失处理并报告
+                        if (src.width, src.height, src.transform, src.crs) != \
+                                (reference['width'], reference['height'], reference['transform'], reference['crs']):
+                            skipped_hours.append(hour)
+                        else:
+                            data = src.read(1).astype('float32')
+                            if src.nodata is not None and not np.isnan(src.nodata):
+                                data[data == src.nodata] = np.nan
+                            dst.update_tags(band, **src.tags())
+                if data is None:
+                    data = np.full((reference['height'], reference['width']), np.nan, dtype='float32')
+                    dst.update_tags(band, HOUR=f"{hour:02d}", MISSING='TRUE')
+                else:
+                    dst.update_tags(band, HOUR=f"{hour:02d}")
+                dst.write(data, band)
+
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        tmp_path = out_path + '.tmp'
+        with memfile.open() as staged:
+            copy_raster(staged, tmp_path, driver='COG', COMPRESS=COMPRESS, PREDICTOR='3',
+                        BLOCKSIZE=str(BLOCK_SIZE), OVERVIEWS='AUTO', RESAMPLING='AVERAGE', BIGTIFF='IF_SAFER')
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        os.replace(tmp_path, out_path)
+    return 'written', date_str, skipped_hours
+
+
+def iter_compaction_tasks(source_dir, output_dir, force):
+    for (pollutant_name, date_str), hour_paths in sorted(group_hourly_files(source_dir).items()):
+        out_path = os.path.join(output_dir, pollutant_name, f"{date_str}.tif")
+        yield pollutant_name, date_str, hour_paths, out_path, force
+
+
+def remove_hourly_files(hour_paths):
+    """合并成功后删除逐小时原始文件，并清理空的日期目录。"""
+    for path in hour_paths.values():
+        os.remove(path)
+    day_dir = os.path.dirname(next(iter(hour_paths.values())))
+    if not os.listdir(day_dir):
+        os.rmdir(day_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把逐小时 GeoTIFF 合并为按天的 24 波段 Cloud-Optimized GeoTIFF")
+    parser.add_argument('--source', default=TIF_BASE_PATH, help="逐小时栅格根目录")
+    parser.add_argument('--output', default=COG_TIF_PATH, help="按天 COG 的输出根目录")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--force', action='store_true', help="忽略已是最新的输出，全部重新合并")
+    parser.add_argument('--remove-hourly', action='store_true', help="合并成功后删除逐小时原始文件")
+    args = parser.parse_args()
+
+    tasks = list(iter_compaction_tasks(args.source, args.output, args.force))
+    if not tasks:
+        print(f"❌ 在路径 '{args.source}' 中未找到逐小时布局的 TIF 文件。")
+        return
+    print(f"✅ 找到 {len(tasks)} 天的逐小时栅格，开始合并...")
+
+    counts = {'written': 0, 'skipped': 0, 'failed': 0}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [(task, executor.submit(compact_day, task)) for task in tasks]
+        for task, future in futures:
+            pollutant_name, date_str, hour_paths = task[:3]
+            try:
+                status, _, skipped_hours = future.result()
+            except Exception as e:
+                counts['failed'] += 1
+                print(f"❌ {pollutant_name} {date_str} 合并失败: {type(e).__name__}: {e}")
+                continue
+            counts[status] += 1
+            missing = sorted(set(range(24)) - set(hour_paths)) + skipped_hours
+            if status == 'written':
+                note = f"，缺少 {len(missing)} 个小时" if missing else ""
+                print(f"  ✅ {pollutant_name} {date_str}: {len(hour_paths) - len(skipped_hours)} 个小时{note}")
+            if args.remove_hourly and not skipped_hours:
+                remove_hourly_files(hour_paths)
+
+    print(f"🎉 合并完成：写出 {counts['written']} 个，已是最新 {counts['skipped']} 个，失败 {counts['failed']} 个。")
+
+
+if __name__ == "__main__":
+    main()
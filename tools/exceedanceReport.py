@@ -0,0 +1,166 @@
+import os
+import csv
+import argparse
+from datetime import date, timedelta
+from psycopg2 import extras
+from importMeasurements import get_db_connection
+
+# ================= 配置部分 =================
+# 报表输出目录，每天生成一个 exceedance_YYYY-MM-DD.csv
+REPORT_DIR = r'../database/reports/'
+
+# NO2 一小时平均浓度二级标准限值 (GB 3095-2012)，单位 μg/m³
+EXCEEDANCE_THRESHOLD = 200.0
+# 滚动 z-score 的基准窗口（小时）和异常阈值
+ZSCORE_WINDOW = 24
+ZSCORE_THRESHOLD = 3.0
+# 站点值与 TIF 值绝对偏差超过该值视为偏离
+DIVERGENCE_THRESHOLD = 40.0
+
+
+# ===========================================
+
+# 所有事件在数据库里用窗口函数一次算完：
+#   1. series：站点值与 TIF 值按 (站点, 污染物, 小时) 对齐，并带上前 ZSCORE_WINDOW 小时的均值/标准差；
+#   2. flagged：对三类事件分别打标记；
+#   3. islands：经典 gaps-and-islands，连续小时编号减去组内行号得到同一区间的分组键。
+# 报表日之前多取 ZSCORE_WINDOW 小时，保证当天 00 时也有完整的滚动基准。
+# fillGaps 插补的小时（is_filled）视为缺测，不参与超标、异常与偏离判断。
+# 滚动基准与后端 detection.rolling_zscore 相同：总体标准差（STDDEV_POP），标准差近似为 0 的小时不判异常，
+# 报表与 /api/events 对同一小时给出相同的 z-score。
+EVENT_QUERY = """
+WITH hours AS (
+    SELECT site_id, pollutant_id, date, hour,
+           (date - DATE '2000-01-01') * 24 + hour AS hour_no
+    FROM measurements
+    WHERE date BETWEEN %(history_start)s AND %(day)s AND NOT is_filled
+    UNION
+    SELECT site_id, pollutant_id, date, hour,
+           (date - DATE '2000-01-01') * 24 + hour AS hour_no
+    FROM measurements_tif
+    WHERE date BETWEEN %(history_start)s AND %(day)s AND NOT is_filled
+),
+series AS (
+    SELECT h.site_id, h.pollutant_id, h.date, h.hour, h.hour_no,
+           m.value AS station_value,
+           t.value AS tif_value,
+           AVG(m.value) OVER w AS station_mean,
+           STDDEV_POP(m.value) OVER w AS station_std,
+           COUNT(m.value) OVER w AS station_n,
+           AVG(t.value) OVER w AS tif_mean,
+           STDDEV_POP(t.value) OVER w AS tif_std,
+           COUNT(t.value) OVER w AS tif_n
+    FROM hours h
+    LEFT JOIN measurements m
+        ON m.site_id = h.site_id AND m.pollutant_id = h.pollutant_id
+       AND m.date = h.date AND m.hour = h.hour AND NOT m.is_filled
+    LEFT JOIN measurements_tif t
+        ON t.site_id = h.site_id AND t.pollutant_id = h.pollutant_id
+       AND t.date = h.date AND t.hour = h.hour AND NOT t.is_filled
+    WINDOW w AS (
+        PARTITION BY h.site_id, h.pollutant_id
+        ORDER BY h.hour_no
+        RANGE BETWEEN %(window)s PRECEDING AND 1 PRECEDING
+    )
+),
+flagged AS (
+    SELECT site_id, pollutant_id, date, hour, hour_no, 'exceedance' AS event_type, 'station' AS source,
+           station_value AS magnitude
+    FROM series WHERE station_value > %(threshold)s
+    UNION ALL
+    SELECT site_id, pollutant_id, date, hour, hour_no, 'exceedance', 'tif', tif_value
+    FROM series WHERE tif_value > %(threshold)s
+    UNION ALL
+    SELECT site_id, pollutant_id, date, hour, hour_no, 'anomaly', 'station',
+           ABS(station_value - station_mean) / station_std
+    FROM series
+    WHERE station_n >= %(min_periods)s AND station_std > 1e-9 AND ABS(station_value - station_mean) / station_std >= %(zscore)s
+    UNION ALL
+    SELECT site_id, pollutant_id, date, hour, hour_no, 'anomaly', 'tif',
+           ABS(tif_value - tif_mean) / tif_std
+    FROM series
+    WHERE tif_n >= %(min_periods)s AND tif_std > 1e-9 AND ABS(tif_value - tif_mean) / tif_std >= %(zscore)s
+    UNION ALL
+    SELECT site_id, pollutant_id, date, hour, hour_no, 'divergence', 'station-tif',
+           ABS(station_value - tif_value)
+    FROM series WHERE ABS(station_value - tif_value) >= %(divergence)s
+),
+islands AS (
+    SELECT *,
+           hour_no - ROW_NUMBER() OVER (
+               PARTITION BY site_id, pollutant_id, event_type, source ORDER BY hour_no
+           ) AS island
+    FROM flagged
+    WHERE date = %(day)s
+)
+SELECT s.site_name, p.pollutant_name, i.event_type, i.source,
+       MIN(i.date + make_interval(hours => i.hour)) AS start_at,
+       MAX(i.date + make_interval(hours => i.hour)) AS end_at,
+       COUNT(*) AS hours,
+       ROUND(MAX(i.magnitude)::numeric, 2) AS peak_value
+FROM islands i
+JOIN sites s ON s.site_id = i.site_id
+JOIN pollutants p ON p.pollutant_id = i.pollutant_id
+GROUP BY s.site_name, p.pollutant_name, i.site_id, i.pollutant_id, i.event_type, i.source, i.island
+ORDER BY p.pollutant_name, s.site_name, start_at, i.event_type
+"""
+
+
+def build_daily_report(cursor, day):
+    """对全网所有站点、所有污染物执行一次窗口查询，返回当天的事件区间。"""
+    params = {
+        'day': day,
+        'history_start': day - timedelta(days=(ZSCORE_WINDOW + 23) // 24),
+        'window': ZSCORE_WINDOW,
+        'min_periods': max(ZSCORE_WINDOW // 2, 2),
+        'threshold': EXCEEDANCE_THRESHOLD,
+        'zscore': ZSCORE_THRESHOLD,
+        'divergence': DIVERGENCE_THRESHOLD,
+    }
+    cursor.execute(EVENT_QUERY, params)
+    return cursor.fetchall()
+
+
+def write_report(rows, day):
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    report_path = os.path.join(REPORT_DIR, f"exceedance_{day.isoformat()}.csv")
+    with open(report_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['site_name', 'pollutant_name', 'event_type', 'source',
+                         'start_at', 'end_at', 'hours', 'peak_value'])
+        for row in rows:
+            writer.writerow([
+                row['site_name'], row['pollutant_name'], row['event_type'], row['source'],
+                row['start_at'].strftime('%Y-%m-%d %H:00'), row['end_at'].strftime('%Y-%m-%d %H:00'),
+                row['hours'], row['peak_value'],
+            ])
+    return report_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成全网逐日超标 / 异常 / 偏离事件报表")
+    parser.add_argument('--date', type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="报表日期 YYYY-MM-DD，默认昨天")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+            rows = build_daily_report(cur, args.date)
+
+        report_path = write_report(rows, args.date)
+        exceedances = sum(1 for row in rows if row['event_type'] == 'exceedance')
+        print(f"✅ {args.date} 共检测到 {len(rows)} 个事件区间（其中超标 {exceedances} 个）。")
+        print(f"🎉 报表已写入: {report_path}")
+
+    except Exception as e:
+        print(f"❌ 生成报表失败: {type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
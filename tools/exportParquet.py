@@ -0,0 +1,139 @@
+import os
+import json
+import argparse
+from datetime import date
+import duckdb
+import pandas as pd
+from importMeasurements import get_db_connection
+from seriesStore import SOURCE_TABLES
+
+# ================= 配置部分 =================
+# Parquet 导出根目录，按 Hive 风格分区：<source>/pollutant_id=<id>/year=<yyyy>/month=<m>/data.parquet
+PARQUET_PATH = r"../database/parquet/"
+
+# 记录每个分区导出时的 [行数, 插补行数]；measurements 只追加，迟到的实测值覆盖插补值时行数不变、插补行数减少，
+# 两者都不变即分区未变化，下次跳过
+STATE_FILE = '_export_state.json'
+
+# Parquet 压缩方式
+COMPRESSION = 'ZSTD'
+
+
+# ===========================================
+
+# 按 (污染物, 年, 月) 汇总行数，用于判断哪些分区需要重新导出
+PARTITION_COUNTS_QUERY = """
+SELECT pollutant_id,
+       EXTRACT(YEAR FROM date)::int AS year,
+       EXTRACT(MONTH FROM date)::int AS month,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE is_filled)
+FROM {table}
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+"""
+
+PARTITION_ROWS_QUERY = """
+SELECT site_id, date, hour, value, is_filled
+FROM {table}
+WHERE pollutant_id = %s AND date >= %s AND date < %s
+ORDER BY site_id, date, hour
+"""
+
+
+# ================= 函数定义 =================
+def partition_dir(root, source, pollutant_id, year, month):
+    return os.path.join(root, source, f"pollutant_id={pollutant_id}", f"year={year}", f"month={month}")
+
+
+def load_state(root):
+    path = os.path.join(root, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(root, state):
+    path = os.path.join(root, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def export_partition(conn, root, source, pollutant_id, year, month):
+    """
+    把一个 (污染物, 年, 月) 分区整体读出，按 site_id、时间排序后写成一个 Parquet 文件。
+    先写临时文件再替换，DuckDB 查询方不会读到写了一半的分区。
+    """
+    first_day = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    with conn.cursor() as cur:
+        cur.execute(PARTITION_ROWS_QUERY.format(table=SOURCE_TABLES[source]), (pollutant_id, first_day, next_month))
+        frame = pd.DataFrame(cur.fetchall(), columns=['site_id', 'date', 'hour', 'value', 'is_filled'])
+
+    out_dir = partition_dir(root, source, pollutant_id, year, month)
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, 'data.parquet')
+    tmp_path = out_path + '.tmp'
+    # COPY ... TO 不支持参数绑定，路径作为 SQL 字符串字面量写入，单引号需要转义
+    quoted_path = tmp_path.replace("'", "''")
+    duckdb.sql(f"""
+        COPY (
+            SELECT site_id::INTEGER AS site_id, date::DATE AS date, hour::TINYINT AS hour,
+                   value::DOUBLE AS value, is_filled::BOOLEAN AS is_filled
+            FROM frame
+        ) TO '{quoted_path}' (FORMAT PARQUET, COMPRESSION {COMPRESSION})
+    """)
+    os.replace(tmp_path, out_path)
+    return len(frame), int(frame['is_filled'].sum())
+
+
+def export_source(conn, root, source, state, full):
+    """导出一个数据源中行数或插补行数发生变化（或尚未导出）的全部分区，返回 (导出分区数, 跳过分区数)。"""
+    with conn.cursor() as cur:
+        cur.execute(PARTITION_COUNTS_QUERY.format(table=SOURCE_TABLES[source]))
+        partitions = cur.fetchall()
+
+    exported = skipped = 0
+    for pollutant_id, year, month, count, filled in partitions:
+        key = f"{source}/{pollutant_id}/{year}/{month}"
+        out_path = os.path.join(partition_dir(root, source, pollutant_id, year, month), 'data.parquet')
+        if not full and state.get(key) == [count, filled] and os.path.exists(out_path):
+            skipped += 1
+            continue
+        rows, filled_rows = export_partition(conn, root, source, pollutant_id, year, month)
+        state[key] = [rows, filled_rows]
+        save_state(root, state)
+        exported += 1
+        print(f"  ✅ {source} 污染物 {pollutant_id} {year}-{month:02d}: {rows} 行")
+    return exported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把 measurements / measurements_tif 增量导出为按 污染物/年/月 分区的 Parquet")
+    parser.add_argument('--output', default=PARQUET_PATH, help="Parquet 导出根目录")
+    parser.add_argument('--source', choices=sorted(SOURCE_TABLES), action='append',
+                        help="只导出指定数据源，可重复；默认全部")
+    parser.add_argument('--full', action='store_true', help="忽略导出记录，重新导出全部分区")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        os.makedirs(args.output, exist_ok=True)
+        state = load_state(args.output)
+        for source in args.source or sorted(SOURCE_TABLES):
+            exported, skipped = export_source(conn, args.output, source, state, args.full)
+            print(f"✅ {source}: 导出 {exported} 个分区，未变化跳过 {skipped} 个。")
+        print(f"🎉 Parquet 导出完成: {os.path.abspath(args.output)}")
+    except Exception as e:
+        print(f"❌ 导出出错: {type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
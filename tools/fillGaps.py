@@ -0,0 +1,338 @@
+import os
+import glob
+import argparse
+from datetime import datetime, timedelta
+import math
+import numpy as np
+import rasterio
+from psycopg2 import extras
+from importTifMeasurements import (
+    TARGET_SITES, TIF_BASE_PATH, band_hours, generate_distinct_id, get_db_connection, load_pollutant_mapping,
+    parse_tif_path
+)
+from seriesStore import sync_after_import
+
+# ================= 配置部分 =================
+# 插补出的栅格输出根目录，目录结构与原始栅格相同：<污染物>/<YYYY_MM_DD>/<HH>.tif
+FILLED_TIF_PATH = r"../database/filled/"
+
+# 只插补不超过该长度（小时）、且两端都有实测值的缺口；更长的缺口保持缺测
+MAX_GAP_HOURS = 3
+
+# 增量插补从高水位（已处理的最新日期）往前回看的天数，覆盖迟到的实测值让旧缺口变得可插补；
+# 更早的补录用 --full 完整扫描一次
+LOOKBACK_DAYS = 7
+
+
+# ===========================================
+
+# 每个 数据源/污染物 的插补高水位，首次运行（没有高水位）时完整扫描
+LOAD_FILL_STATE_QUERY = """
+SELECT p.pollutant_id, s.filled_through
+FROM pollutants p
+LEFT JOIN fill_state s ON s.source = %s AND s.pollutant_id = p.pollutant_id
+"""
+
+SAVE_FILL_STATE_QUERY = """
+INSERT INTO fill_state (source, pollutant_id, filled_through)
+VALUES %s
+ON CONFLICT (source, pollutant_id) DO UPDATE SET
+    filled_through = GREATEST(fill_state.filled_through, EXCLUDED.filled_through)
+"""
+
+# ================= 函数定义 =================
+def interpolate_gaps(grid, max_gap):
+    """
+    对 [序列 × 小时] 矩阵中的内部缺口做线性插值，整张矩阵一次完成。
+    返回 (插补后的矩阵, 被插补位置的布尔掩码)。
+    """
+    grid = np.atleast_2d(np.asarray(grid, dtype=float))
+    width = grid.shape[1]
+    index = np.arange(width)
+    valid = ~np.isnan(grid)
+
+    # 每个位置左侧 / 右侧最近的有效小时
+    prev_valid = np.maximum.accumulate(np.where(valid, index, -1), axis=1)
+    next_valid = np.minimum.accumulate(np.where(valid, index, width)[:, ::-1], axis=1)[:, ::-1]
+
+    fill = ~valid & (prev_valid >= 0) & (next_valid < width) & (next_valid - prev_valid - 1 <= max_gap)
+    rows = np.nonzero(fill)[0]
+    left, right = prev_valid[fill], next_valid[fill]
+    weight = (index[np.nonzero(fill)[1]] - left) / (right - left)
+
+    filled = grid.copy()
+    filled[fill] = grid[rows, left] * (1 - weight) + grid[rows, right] * weight
+    return filled, fill
+
+
+def load_fill_state(conn, source, lookback_days, full):
+    """返回 {pollutant_id: scan_from}：只插补 scan_from 及之后的缺口，为 None 时完整扫描。"""
+    with conn.cursor() as cur:
+        cur.execute(LOAD_FILL_STATE_QUERY, (source,))
+        return {
+            pollutant_id: None if full or filled_through is None else filled_through - timedelta(days=lookback_days)
+            for pollutant_id, filled_through in cur.fetchall()
+        }
+
+
+def save_fill_state(conn, source, filled_through):
+    """记录本次已处理到的最新日期 {pollutant_id: date}。"""
+    if not filled_through:
+        return
+    with conn.cursor() as cur:
+        extras.execute_values(cur, SAVE_FILL_STATE_QUERY,
+                              [(source, pollutant_id, day) for pollutant_id, day in filled_through.items()])
+    conn.commit()
+
+
+def anchor_days(max_gap):
+    """scan_from 当天开头的缺口需要前一段的实测值作锚点，往前多读取的天数。"""
+    return math.ceil((max_gap + 1) / 24)
+
+
+def filled_raster_path(pollutant_name, moment):
+    return os.path.join(FILLED_TIF_PATH, pollutant_name, moment.strftime('%Y_%m_%d'), f"{moment.hour:02d}.tif")
+
+
+def scan_raster_timeline(pollutant_map, scan_from=None, max_gap=MAX_GAP_HOURS):
+    """
+    扫描 TIF_BASE_PATH，按污染物整理出 {pollutant_id: {datetime: (path, band)}}，
+    逐小时文件与按天合并的 24 波段 COG 都可识别；并打印每天缺失的小时，便于运维核对。
+    scan_from 为 {pollutant_id: 日期}，早于该日期（减去锚点天数）的栅格不读取。
+    """
+    scan_from = scan_from or {}
+    timelines = {}
+    for tif_path in glob.iglob(os.path.join(TIF_BASE_PATH, "**", "*.tif"), recursive=True):
+        parsed = parse_tif_path(os.path.normpath(tif_path), pollutant_map)
+        if not parsed:
+            continue
+        since = scan_from.get(parsed['pollutant_id'])
+        if since is not None and parsed['date'] < since - timedelta(days=anchor_days(max_gap)):
+            continue
+        midnight = datetime.combine(parsed['date'], datetime.min.time())
+        timeline = timelines.setdefault(parsed['pollutant_id'], {})
+        if parsed['hour'] is not None:
+            timeline[midnight + timedelta(hours=parsed['hour'])] = (tif_path, 1)
+            continue
+        with rasterio.open(tif_path) as src:
+            for band, hour in band_hours(src):
+                timeline[midnight + timedelta(hours=hour)] = (tif_path, band)
+
+    for pollutant_id, timeline in timelines.items():
+        since = scan_from.get(pollutant_id)
+        days = sorted({moment.date() for moment in timeline})
+        for day in days:
+            if since is not None and day < since:
+                continue
+            present = {moment.hour for moment in timeline if moment.date() == day}
+            missing = sorted(set(range(24)) - present)
+            if missing:
+                print(f"⚠️ 污染物 {pollutant_id} {day} 缺少 {len(missing)} 个小时: {', '.join(f'{h:02d}' for h in missing)}")
+    return timelines
+
+
+def find_raster_gaps(timeline, max_gap):
+    """在逐小时时间轴上找出两端都有栅格、长度不超过 max_gap 的缺口，返回 [(前一小时, 后一小时)]。"""
+    moments = sorted(timeline)
+    gaps = []
+    for before, after in zip(moments, moments[1:]):
+        missing = int((after - before) / timedelta(hours=1)) - 1
+        if 0 < missing <= max_gap:
+            gaps.append((before, after))
+    return gaps
+
+
+def fill_raster_gap(before_source, after_source, before, after, pollutant_name):
+    """
+    读入缺口两端的栅格（(路径, 波段)，按天合并的 COG 只读对应小时的波段），用广播一次算出缺口内全部小时的整幅栅格 [k × 行 × 列]，
+    逐小时写出带 FILLED 标签的 GeoTIFF。返回 [(时间, 输出路径, 栅格数组)] 与栅格的 transform。
+    """
+    before_path, before_band = before_source
+    after_path, after_band = after_source
+    with rasterio.open(before_path) as src:
+        start_grid = src.read(before_band).astype('float32')
+        profile = src.profile.copy()
+        nodata = src.nodata
+    with rasterio.open(after_path) as src:
+        end_grid = src.read(after_band).astype('float32')
+
+    for grid in (start_grid, end_grid):
+        if nodata is not None and not np.isnan(nodata):
+            grid[grid == nodata] = np.nan
+
+    span = int((after - before) / timedelta(hours=1))
+    weights = (np.arange(1, span) / span).astype('float32')[:, None, None]
+    filled = start_grid[None] * (1 - weights) + end_grid[None] * weights
+
+    profile.update(driver='GTiff', dtype='float32', nodata=float('nan'), count=1, compress='deflate')
+    outputs = []
+    for offset, grid in enumerate(filled, start=1):
+        moment = before + timedelta(hours=offset)
+        out_path = filled_raster_path(pollutant_name, moment)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with rasterio.open(out_path, 'w', **profile) as dst:
+            dst.write(grid, 1)
+            dst.update_tags(FILLED='TRUE', FILLED_FROM=f"{before:%Y-%m-%d %H}:00 ~ {after:%Y-%m-%d %H}:00")
+        outputs.append((moment, out_path, grid))
+    return outputs, profile['transform']
+
+
+def sample_sites(grids, transform):
+    """对一组栅格 [k × 行 × 列] 一次性取出所有目标站点的像素值，返回 [k × 站点]。"""
+    height, width = grids.shape[1:]
+    inverse = ~transform
+    cols, rows = [], []
+    for site in TARGET_SITES:
+        col, row = inverse * (site['longitude'], site['latitude'])
+        cols.append(int(np.floor(col)))
+        rows.append(int(np.floor(row)))
+    cols, rows = np.array(cols), np.array(rows)
+    inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    values = np.full((grids.shape[0], len(TARGET_SITES)), np.nan, dtype='float32')
+    values[:, inside] = grids[:, rows[inside], cols[inside]]
+    return values
+
+
+def fill_rasters(conn, pollutant_map, max_gap, lookback_days=LOOKBACK_DAYS, full=False):
+    """只处理高水位往前 lookback_days 天之后的缺口，已写出插补栅格的缺口直接跳过。"""
+    pollutant_names = {pollutant_id: name for name, pollutant_id in pollutant_map.items()}
+    scan_from = load_fill_state(conn, 'tif', lookback_days, full)
+    timelines = scan_raster_timeline(pollutant_map, scan_from, max_gap)
+    records = []
+    written = 0
+    for pollutant_id, timeline in timelines.items():
+        since = scan_from.get(pollutant_id)
+        name = pollutant_names[pollutant_id]
+        for before, after in find_raster_gaps(timeline, max_gap):
+            if since is not None and after.date() < since:
+                continue
+            span = int((after - before) / timedelta(hours=1))
+            if all(os.path.exists(filled_raster_path(name, before + timedelta(hours=offset)))
+                   for offset in range(1, span)):
+                continue
+            outputs, transform = fill_raster_gap(timeline[before], timeline[after], before, after, name)
+            written += len(outputs)
+            values = sample_sites(np.stack([grid for _, _, grid in outputs]), transform)
+            for (moment, out_path, _), site_values in zip(outputs, values):
+                for site, value in zip(TARGET_SITES, site_values):
+                    if np.isnan(value) or value < 0:
+                        continue
+                    distinct_id = generate_distinct_id(moment.date(), moment.hour, site['site_id'], pollutant_id)
+                    records.append((distinct_id, site['site_id'], pollutant_id, moment.date(), moment.hour,
+                                    round(float(value), 2), os.path.normpath(out_path)))
+
+    if records:
+        with conn.cursor() as cur:
+            extras.execute_values(cur, """
+                INSERT INTO measurements_tif (distinct_id, site_id, pollutant_id, date, hour, value, data_dir, is_filled)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, records, template="(%s, %s, %s, %s, %s, %s, %s, TRUE)")
+        conn.commit()
+        sync_after_import(conn, 'tif', {(record[2], record[3]) for record in records})
+    save_fill_state(conn, 'tif', {
+        pollutant_id: max(timeline).date() for pollutant_id, timeline in timelines.items() if timeline
+    })
+    return written, len(records)
+
+
+def station_gap_records(rows, first_day, last_day, scan_from, max_gap):
+    """
+    rows 为同一污染物的 (site_id, date, hour, value, is_filled)，按站点装成稠密矩阵整体插补。
+    只有实测值作锚点；已有插补记录的小时、早于 scan_from 的小时不再生成记录。
+    """
+    site_ids = sorted({row[0] for row in rows})
+    site_index = {site_id: i for i, site_id in enumerate(site_ids)}
+    hours = ((last_day - first_day).days + 1) * 24
+    grid = np.full((len(site_ids), hours), np.nan)
+    existing = np.zeros(grid.shape, dtype=bool)
+    for site_id, day, hour, value, is_filled in rows:
+        position = (site_index[site_id], (day - first_day).days * 24 + hour)
+        if is_filled:
+            existing[position] = True
+        else:
+            grid[position] = value
+
+    filled, mask = interpolate_gaps(grid, max_gap)
+    mask &= ~existing
+    if scan_from is not None:
+        mask[:, :max((scan_from - first_day).days, 0) * 24] = False
+    records = []
+    for series, offset in zip(*np.nonzero(mask)):
+        day = first_day + timedelta(days=int(offset) // 24)
+        records.append((site_ids[series], day, int(offset) % 24, round(float(filled[series, offset]), 2)))
+    return records
+
+
+def fill_station_gaps(conn, max_gap, lookback_days=LOOKBACK_DAYS, full=False):
+    """逐污染物读取高水位往前 lookback_days 天之后的站点数据，插补短缺口后批量写回。"""
+    records = []
+    filled_through = {}
+    for pollutant_id, scan_from in load_fill_state(conn, 'station', lookback_days, full).items():
+        load_from = None if scan_from is None else scan_from - timedelta(days=anchor_days(max_gap))
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT site_id, date, hour, value, is_filled
+                FROM measurements
+                WHERE pollutant_id = %(pollutant_id)s AND value IS NOT NULL
+                  AND (%(load_from)s::date IS NULL OR date >= %(load_from)s::date)
+            """, {'pollutant_id': pollutant_id, 'load_from': load_from})
+            rows = cur.fetchall()
+        measured = [row[1] for row in rows if not row[4]]
+        if not measured:
+            continue
+        first_day, last_day = min(row[1] for row in rows), max(measured)
+        filled_through[pollutant_id] = last_day
+        for site_id, day, hour, value in station_gap_records(rows, first_day, last_day, scan_from, max_gap):
+            distinct_id = generate_distinct_id(day, hour, site_id, pollutant_id)
+            records.append((distinct_id, site_id, pollutant_id, day, hour, value))
+
+    if records:
+        with conn.cursor() as cur:
+            extras.execute_values(cur, """
+                INSERT INTO measurements (distinct_id, site_id, pollutant_id, date, hour, value, is_filled)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+            """, records, template="(%s, %s, %s, %s, %s, %s, TRUE)")
+        conn.commit()
+        sync_after_import(conn, 'station', {(record[2], record[3]) for record in records})
+    save_fill_state(conn, 'station', filled_through)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测并插补缺测的逐小时栅格与站点数据")
+    parser.add_argument('--max-gap', type=int, default=MAX_GAP_HOURS, help="可插补的最长缺口（小时）")
+    parser.add_argument('--skip-rasters', action='store_true')
+    parser.add_argument('--skip-stations', action='store_true')
+    parser.add_argument('--lookback-days', type=int, default=LOOKBACK_DAYS, help="增量插补从高水位往前回看的天数")
+    parser.add_argument('--full', action='store_true', help="忽略高水位，完整扫描全部历史（补录较早数据后使用）")
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    try:
+        with conn.cursor() as cur:
+            pollutant_map = load_pollutant_mapping(cur)
+
+        if not args.skip_rasters:
+            written, inserted = fill_rasters(conn, pollutant_map, args.max_gap, args.lookback_days, args.full)
+            print(f"✅ 插补栅格 {written} 个，写入 measurements_tif {inserted} 条插补记录。")
+
+        if not args.skip_stations:
+            inserted = fill_station_gaps(conn, args.max_gap, args.lookback_days, args.full)
+            print(f"✅ 写入 measurements {inserted} 条插补记录。")
+
+        print("🎉 缺测插补完成。")
+
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ 缺测插补出错，未提交的操作已回滚: {type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
 import os
 import glob
+import time
 import pandas as pd
 import psycopg2
 from psycopg2 import extras
 # 确保 config.py 能够被导入
 import config
 from datetime import datetime  # 导入 datetime 库用于日期处理
+from importStats import ImportStats
+from seriesStore import sync_after_import
 
 # ================= 配置部分 =================
 # 指定存放 CSV 文件的文件夹路径 (默认当前目录)
 CSV_FOLDER_PATH = r'../database/test/' #这里是csv数据的目录
 
+# 吞吐与分阶段耗时统计（read / transform / insert），main 结束时打印
+STATS = ImportStats('importMeasurements')
 
 # ===========================================
 
@@ -59,12 +64,18 @@ def generate_distinct_id(date_str, hour, site_id, pollutant_id):
     return f"{date_str}-{hour_str}{site_id}{pollutant_id}"
 
 
-def process_csv_and_insert(file_path, cursor, site_map, pollutant_map):
+def process_csv_and_insert(file_path, cursor, site_map, pollutant_map, stats=STATS, touched=None):
+    """
+    读取单个 CSV 并批量插入 measurements（不提交，由调用方控制事务）。
+    touched 为可选集合，收集本文件涉及的 (pollutant_id, 日期)，供提交后同步时间序列存储。
+    """
     print(f"📄 正在处理文件: {file_path} ...")
 
     try:
         # 1. 读取 CSV
-        df = pd.read_csv(file_path)
+        with stats.stage('read'):
+            df = pd.read_csv(file_path)
+        transform_started = time.perf_counter()
 
         # 2. 数据转换 (Wide to Long)
         id_vars = ['data', 'hour', 'type']
@@ -80,8 +91,9 @@ def process_csv_and_insert(file_path, cursor, site_map, pollutant_map):
         # 3. 数据清洗
         melted_df = melted_df.dropna(subset=['value'])
 
-        # 准备批量插入的数据列表
-        records_to_insert = []
+        # 准备批量插入的数据列表（按 distinct_id 去重，同一小时重复出现时以后一行为准；
+        # ON CONFLICT DO UPDATE 不允许一条语句两次修改同一行）
+        records_to_insert = {}
 
         for _, row in melted_df.iterrows():
             date_val = row['data']  # CSV header 是 data (例如: '2024-01-01')
@@ -105,7 +117,11 @@ def process_csv_and_insert(file_path, cursor, site_map, pollutant_map):
             distinct_id = generate_distinct_id(date_val, hour_val, site_id, pollutant_id)
 
             # 【修改】将 distinct_id 添加到记录中
-            records_to_insert.append((distinct_id, site_id, pollutant_id, date_val, hour_val, value))
+            records_to_insert[distinct_id] = (distinct_id, site_id, pollutant_id, date_val, hour_val, value)
+            if touched is not None:
+                touched.add((pollutant_id, date_val))
+
+        stats.add_stage_time('transform', time.perf_counter() - transform_started)
 
         # 4. 批量插入数据库
         if records_to_insert:
@@ -113,11 +129,15 @@ def process_csv_and_insert(file_path, cursor, site_map, pollutant_map):
                 -- 【修改】包含 distinct_id 字段
                 INSERT INTO measurements (distinct_id, site_id, pollutant_id, date, hour, value)
                 VALUES %s
-                -- 由于 distinct_id 是主键，如果重复则会冲突，但这里使用 DO NOTHING 保持幂等性
-                ON CONFLICT DO NOTHING
+                -- 已有实测值时跳过保持幂等；已有的是 fillGaps 插补值时用实测值覆盖
+                ON CONFLICT (site_id, pollutant_id, date, hour) DO UPDATE
+                SET value = EXCLUDED.value, is_filled = FALSE
+                WHERE measurements.is_filled
             """
             # 【修改】execute_values 模板需要 6 个参数 (distinct_id, site_id, pollutant_id, date, hour, value)
-            extras.execute_values(cursor, insert_query, records_to_insert, template="(%s, %s, %s, %s, %s, %s)")
+            with stats.stage('insert'):
+                extras.execute_values(cursor, insert_query, list(records_to_insert.values()),
+                                      template="(%s, %s, %s, %s, %s, %s)")
             return len(records_to_insert)
         else:
             print("⚠️ 该文件没有有效数据可插入。")
@@ -149,29 +169,37 @@ def main():
             return
 
         total_inserted = 0
+        STATS.reset()
 
         for csv_file in csv_files:
             inserted_count = 0
+            touched = set()
             file_name = os.path.basename(csv_file)
             print(f"🔍 正在处理文件: {file_name}")
 
             try:
                 # 尝试处理文件
-                inserted_count = process_csv_and_insert(csv_file, cur, site_map, pollutant_map)
+                inserted_count = process_csv_and_insert(csv_file, cur, site_map, pollutant_map, touched=touched)
                 total_inserted += inserted_count
 
                 # 【增强事务】单个文件处理成功后立即提交
-                conn.commit()
+                with STATS.stage('insert'):
+                    conn.commit()
+                with STATS.stage('sync'):
+                    sync_after_import(conn, 'station', touched)
+                STATS.add_file(inserted_count)
                 print(f"✅ 文件 {file_name} 处理成功，插入 {inserted_count} 条记录并已提交。")
 
             except Exception as file_error:
                 # 【增强事务】如果单个文件处理失败，回滚当前文件的操作
                 conn.rollback()
+                STATS.add_file(error=True)
                 print(f"❌ 文件 {file_name} 处理失败，操作已回滚。")
                 print(f"❌ 详细错误: {type(file_error).__name__}: {file_error}")
                 # 继续处理下一个文件
 
         print(f"🎉 所有文件处理完毕，数据库操作结束。总计插入 {total_inserted} 条记录。")
+        STATS.report()
 
     except Exception as e:
         # 捕获连接或初始设置的错误
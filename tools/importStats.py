@@ -0,0 +1,68 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class ImportStats:
+    """
+    导入脚本的吞吐与分阶段耗时统计：
+    - stage(name)：上下文管理器，累计某个阶段（如 read / sample / insert）的耗时；
+    - add_file(rows)：记录处理完一个文件及其插入行数；
+    - report()：打印 files/s、rows/s 与各阶段耗时占比。
+    线程安全，可在多个工作线程间共享同一个实例。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.files = 0
+            self.rows = 0
+            self.errors = 0
+            self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage_time(name, time.perf_counter() - started)
+
+    def add_stage_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_file(self, rows=0, error=False):
+        with self._lock:
+            self.files += 1
+            self.rows += rows
+            self.errors += int(error)
+
+    def as_dict(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                'name': self.name,
+                'elapsed_s': round(elapsed, 3),
+                'files': self.files,
+                'rows': self.rows,
+                'errors': self.errors,
+                'files_per_s': round(self.files / elapsed, 2) if elapsed else None,
+                'rows_per_s': round(self.rows / elapsed, 1) if elapsed else None,
+                'stages_s': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            }
+
+    def report(self):
+        summary = self.as_dict()
+        print(f"⏱️ [{self.name}] 共 {summary['files']} 个文件 / {summary['rows']} 条记录，"
+              f"耗时 {summary['elapsed_s']} 秒：{summary['files_per_s']} files/s，{summary['rows_per_s']} rows/s，"
+              f"失败 {summary['errors']} 个文件。")
+        total = sum(self.stages.values()) or 1.0
+        for name, seconds in sorted(self.stages.items(), key=lambda item: -item[1]):
+            print(f"   - {name:<8} {seconds:8.3f} 秒 ({seconds / total:6.1%})")
+        return summary
@@ -1,11 +1,14 @@
 import os
 import glob
 import re
+import time
 from datetime import datetime
 import psycopg2
 from psycopg2 import extras
 import rasterio
 import config  # 导入数据库配置文件
+from importStats import ImportStats
+from seriesStore import sync_after_import
 
 # ================= 配置部分 =================
 # 必须修改为你TIF文件的根目录，脚本会递归搜索所有 .tif 文件
@@ -17,6 +20,9 @@ TARGET_SITES = [
     {'site_id': 29, 'longitude': 116.47456, 'latitude': 39.78284},  # 大兴旧宫
 ]
 
+# 吞吐与分阶段耗时统计（parse / sample / insert），main 结束时打印
+STATS = ImportStats('importTifMeasurements')
+
 
 # ================= 函数定义 =================
 def generate_distinct_id(date_obj, hour, site_id, pollutant_id):
@@ -57,12 +63,15 @@ def load_pollutant_mapping(cursor):
 
 def parse_tif_path(file_path, pollutant_map):
     """
-    解析TIF文件路径，提取污染物、日期和小时。
-    Example path: .../NO2/2024_02_08/00.tif
+    解析TIF文件路径，提取污染物、日期和小时。支持两种目录布局：
+    - 逐小时文件: .../NO2/2024_02_08/00.tif
+    - 按天合并的 24 波段 COG（tools/compactDailyCog.py 生成）: .../NO2/2024_02_08.tif，此时 hour 为 None
     """
-    # 使用正则表达式匹配路径中的关键信息：/污染物/日期/小时.tif
+    # 使用正则表达式匹配路径中的关键信息：/污染物/日期/小时.tif 或 /污染物/日期.tif
     # re.IGNORECASE 忽略大小写
     match = re.search(r'[/\\](\w+)[/\\](\d{4}_\d{2}_\d{2})[/\\](\d{2})\.tif$', file_path, re.IGNORECASE)
+    if not match:
+        match = re.search(r'[/\\](\w+)[/\\](\d{4}_\d{2}_\d{2})()\.tif$', file_path, re.IGNORECASE)
 
     if not match:
         return None
@@ -78,7 +87,7 @@ def parse_tif_path(file_path, pollutant_map):
             return None
 
         date_obj = datetime.strptime(date_str, '%Y_%m_%d').date()
-        hour = int(hour_str)
+        hour = int(hour_str) if hour_str else None
 
         return {
             'pollutant_id': pollutant_id,
@@ -91,6 +100,39 @@ def parse_tif_path(file_path, pollutant_map):
         return None
 
 
+def band_hours(src):
+    """
+    返回按天合并的栅格中每个波段对应的小时 [(波段号, 小时)]。
+    波段标签 HOUR 记录小时；MISSING=TRUE 的波段表示当天该小时原始数据缺失，跳过。
+    """
+    hours = []
+    for band in range(1, src.count + 1):
+        tags = src.tags(band)
+        if tags.get('MISSING') == 'TRUE':
+            continue
+        hours.append((band, int(tags.get('HOUR', band - 1))))
+    return hours
+
+
+def extract_daily_pixel_values(tif_path, longitude, latitude):
+    """
+    一次读取按天合并栅格在指定经纬度处全部波段的像素值，返回 {小时: 值}，NoData 的小时不包含在内。
+    """
+    try:
+        with rasterio.open(tif_path) as src:
+            values = next(src.sample([(longitude, latitude)]))
+            result = {}
+            for band, hour in band_hours(src):
+                value = values[band - 1]
+                if value != value or (src.nodata is not None and value == src.nodata):
+                    continue
+                result[hour] = round(float(value), 2)
+            return result
+    except Exception as e:
+        print(f"❌ 提取像素值时出错 ({os.path.basename(tif_path)}): {e}")
+        return {}
+
+
 def extract_pixel_value(tif_path, longitude, latitude):
     """
     使用 rasterio 读取TIF文件，提取指定经纬度点的像素值，并保留两位小数。
@@ -119,15 +161,19 @@ def extract_pixel_value(tif_path, longitude, latitude):
 
 
 # ================= 核心修改函数：引入 conn 进行局部事务控制 =================
-def process_single_tif(tif_path, conn, pollutant_map):
+def process_single_tif(tif_path, conn, pollutant_map, stats=STATS, touched=None):
     """
     【关键修改】处理单个TIF文件，解析信息并提取目标站点数据，批量插入。
     - 引入 conn 参数，用于在函数内进行独立的 commit/rollback。
-    - 使用 ON CONFLICT (distinct_id) DO NOTHING 实现主键冲突跳过。
+    - 使用 ON CONFLICT (distinct_id) 实现主键冲突跳过；冲突的是插补记录（is_filled）时改为覆盖。
+    - 数据库写入失败时回滚当前文件后重新抛出，由调用方（main / 后台导入任务）记录错误。
+    - 传入 touched 时只把写入的 (pollutant_id, 日期) 记入其中，由调用方在整批文件导入后统一同步时间序列存储；
+      同一天的 24 个小时文件不会把同一批分片重写 24 次。未传入时提交后立即同步。
     """
     # 标准化路径，以便在数据库中存储统一格式
     normalized_path = os.path.normpath(tif_path)
-    parsed_info = parse_tif_path(normalized_path, pollutant_map)
+    with stats.stage('parse'):
+        parsed_info = parse_tif_path(normalized_path, pollutant_map)
 
     if not parsed_info:
         print(f"⚠️ 路径或污染物信息解析失败: {normalized_path}")
@@ -141,49 +187,57 @@ def process_single_tif(tif_path, conn, pollutant_map):
         longitude = site['longitude']
         latitude = site['latitude']
 
-        # 提取值
-        value = extract_pixel_value(normalized_path, longitude, latitude)
-
-        if value is None:
-            continue
-
-        # 【新增健壮性检查】简单检查值是否为非负数
-        if value < 0:
-            print(f"⚠️ 像素值 ({value}) 无效（<0），已跳过。文件: {os.path.basename(tif_path)}, 站点: {site_id}")
-            continue
-
-        # 计算 distinct_id
-        distinct_id = generate_distinct_id(
-            parsed_info['date'],
-            parsed_info['hour'],
-            site_id,
-            parsed_info['pollutant_id']
-        )
-
-        # 构造要插入的记录
-        record = (
-            distinct_id,
-            site_id,
-            parsed_info['pollutant_id'],
-            parsed_info['date'],
-            parsed_info['hour'],
-            value,
-            parsed_info['data_dir'],
-        )
-        records_to_insert.append(record)
+        # 提取值：逐小时文件只有一个值，按天合并的 COG 一次取出全部 24 个小时
+        with stats.stage('sample'):
+            if parsed_info['hour'] is None:
+                hourly_values = extract_daily_pixel_values(normalized_path, longitude, latitude)
+            else:
+                hourly_values = {parsed_info['hour']: extract_pixel_value(normalized_path, longitude, latitude)}
+
+        for hour, value in hourly_values.items():
+            if value is None:
+                continue
+
+            # 【新增健壮性检查】简单检查值是否为非负数
+            if value < 0:
+                print(f"⚠️ 像素值 ({value}) 无效（<0），已跳过。文件: {os.path.basename(tif_path)}, 站点: {site_id}")
+                continue
+
+            # 计算 distinct_id
+            distinct_id = generate_distinct_id(
+                parsed_info['date'],
+                hour,
+                site_id,
+                parsed_info['pollutant_id']
+            )
+
+            # 构造要插入的记录
+            record = (
+                distinct_id,
+                site_id,
+                parsed_info['pollutant_id'],
+                parsed_info['date'],
+                hour,
+                value,
+                parsed_info['data_dir'],
+            )
+            records_to_insert.append(record)
 
     # 批量插入数据库
     if records_to_insert:
         cur = None
+        insert_started = time.perf_counter()
         try:
             cur = conn.cursor()
 
-            # 【核心修改】使用 ON CONFLICT (distinct_id) DO NOTHING
+            # 【核心修改】使用 ON CONFLICT (distinct_id)：已有实测值时跳过，已有插补值时覆盖
             insert_query = """
                 INSERT INTO measurements_tif (distinct_id, site_id, pollutant_id, date, hour, value, data_dir)
                 VALUES %s
-                -- 遇到 distinct_id 主键冲突时，直接跳过该条记录，不影响其他记录和事务。
-                ON CONFLICT (distinct_id) DO NOTHING 
+                -- 遇到 distinct_id 主键冲突时，实测记录直接跳过；fillGaps 写入的插补记录由迟到的实测栅格覆盖。
+                ON CONFLICT (distinct_id) DO UPDATE
+                SET value = EXCLUDED.value, data_dir = EXCLUDED.data_dir, is_filled = FALSE
+                WHERE measurements_tif.is_filled
             """
 
             # 批量执行插入
@@ -193,17 +247,24 @@ def process_single_tif(tif_path, conn, pollutant_map):
             conn.commit()
             inserted_count = cur.rowcount  # 获取实际插入的行数（包含新增和更新）
 
-            return inserted_count
-
-        except Exception as e:
+        except Exception:
             # 【关键修改】如果发生非冲突错误（如类型错误），回滚当前事务，但只影响当前 TIF 文件。
             conn.rollback()
-            print(f"❌ 数据库操作失败并回滚 (文件: {os.path.basename(tif_path)}): {e}")
-            return 0
+            raise
         finally:
+            stats.add_stage_time('insert', time.perf_counter() - insert_started)
             if cur:
                 cur.close()
 
+        key = (parsed_info['pollutant_id'], parsed_info['date'])
+        if touched is not None:
+            touched.add(key)
+        else:
+            # 提交后把这一天同步到内存映射时间序列存储
+            with stats.stage('sync'):
+                sync_after_import(conn, 'tif', {key})
+        return inserted_count
+
     return 0
 
 
@@ -231,17 +292,31 @@ def main():
         print(f"✅ 找到 {len(tif_files)} 个 TIF 文件，开始处理...")
 
         total_inserted = 0
+        touched = set()
+        STATS.reset()
 
         # 使用 enumerate 可以显示进度
         for i, tif_file in enumerate(tif_files):
             # 将 conn 传递给 process_single_tif，让它在内部管理事务
-            inserted_count = process_single_tif(tif_file, conn, pollutant_map)
+            try:
+                inserted_count = process_single_tif(tif_file, conn, pollutant_map, touched=touched)
+            except Exception as file_error:
+                # 当前文件已回滚，继续处理下一个文件
+                STATS.add_file(error=True)
+                print(f"❌ 数据库操作失败并回滚 (文件: {os.path.basename(tif_file)}): "
+                      f"{type(file_error).__name__}: {file_error}")
+                continue
             total_inserted += inserted_count
+            STATS.add_file(inserted_count)
             # 打印进度和结果
             print(f"[{i + 1}/{len(tif_files)}] -> {os.path.basename(tif_file)}: 成功插入 {inserted_count} 条记录。")
 
         # 【移除】不再需要 conn.commit()，每个 TIF 文件已独立提交
+        # 全部文件导入后，涉及的天统一同步一次时间序列存储
+        with STATS.stage('sync'):
+            sync_after_import(conn, 'tif', touched)
         print(f"🎉 所有 TIF 文件处理完毕，共插入 {total_inserted} 条记录。")
+        STATS.report()
 
     except Exception as e:
         # 捕捉初始化阶段（如加载污染物映射表）的错误
@@ -0,0 +1,328 @@
+import os
+import argparse
+import threading
+from datetime import date, datetime
+import numpy as np
+
+# ================= 配置部分 =================
+# 内存映射时间序列的根目录；设为 None 关闭（导入脚本不再同步，后端回退到 SQL 查询）
+SERIES_STORE_PATH = r"../database/series/"
+
+# 站点行按该数量成块扩容，新站点出现时极少需要改动文件
+SITE_ROW_CHUNK = 64
+
+# 同步时持有的 PostgreSQL advisory lock 编号：保证"读数据库 + 写文件"在多个导入进程/线程间串行，
+# 后提交的导入一定最后写入，不会被先前读到的旧快照覆盖
+SYNC_LOCK_ID = 20340001
+
+SOURCE_TABLES = {
+    'station': 'measurements',
+    'tif': 'measurements_tif',
+}
+
+
+# ===========================================
+
+# ================= 函数定义 =================
+def year_hours(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days * 24
+
+
+def year_spans(start_date, end_date):
+    """把 [start_date, end_date] 按自然年切开，返回 [(年, 年内第一天序号, 年内最后一天序号)]。"""
+    spans = []
+    for year in range(start_date.year, end_date.year + 1):
+        first = max(start_date, date(year, 1, 1))
+        last = min(end_date, date(year, 12, 31))
+        origin = date(year, 1, 1).toordinal()
+        spans.append((year, first.toordinal() - origin, last.toordinal() - origin))
+    return spans
+
+
+def days_by_pollutant(keys):
+    """把 (pollutant_id, 日期) 整理为 {pollutant_id: {日期}}。"""
+    grouped = {}
+    for pollutant_id, day in keys:
+        if isinstance(day, str):
+            # CSV 中的日期是原样字符串，兼容 2024-09-24 与 2024/9/24
+            day = datetime.strptime(day.strip().replace('/', '-'), '%Y-%m-%d').date()
+        grouped.setdefault(pollutant_id, set()).add(day)
+    return grouped
+
+
+class SeriesStore:
+    """
+    只追加、可内存映射的逐小时时间序列存储。
+
+    每个 (数据源, 污染物, 年) 一个分片：
+    - <source>/<pollutant_id>/<year>.f32   float32 稠密矩阵 [站点行 × 年内小时]，行号即 site_id，缺测为 NaN；
+    - <source>/<pollutant_id>/<year>.filled uint8 [站点行 × 年内小时]，1 表示该小时是 fillGaps 的插补值；
+    - <source>/<pollutant_id>/<year>.rev   int64 [站点行 × 年内天数]，同步时读到的 data_versions.revision（无记录为 0）；
+    - <source>/<pollutant_id>/<year>.days  uint8 [年内天数]，1 表示该天已与数据库逐站点对齐。
+    矩阵按站点行优先存放，单站点的任意时间段是一段连续内存；新增站点只需在文件末尾追加行。
+    写入总是先写值、再写版本、最后标记覆盖，读取方只信任已覆盖的天，其余情况返回 None 由调用方回退到 SQL。
+    同步时先读版本、后读数据，存储中的值总是不旧于记录的版本。
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def shard_paths(self, source, pollutant_id, year):
+        base = os.path.join(self.root, source, str(pollutant_id), str(year))
+        return base + '.f32', base + '.days', base + '.filled', base + '.rev'
+
+    # ---------- 读取 ----------
+    def _open_reader(self, path, dtype, row_length):
+        """按文件大小缓存只读映射；文件扩容后大小变化，自动重新映射。"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        if size < row_length * np.dtype(dtype).itemsize:
+            return None
+        with self._lock:
+            cached = self._readers.get(path)
+            if cached is None or cached[0] != size:
+                rows = size // (row_length * np.dtype(dtype).itemsize)
+                cached = (size, np.memmap(path, dtype=dtype, mode='r', shape=(rows, row_length)))
+                self._readers[path] = cached
+        return cached[1]
+
+    def read(self, source, pollutant_id, site_id, start_date, end_date, revision=None):
+        """
+        返回 [start_date, end_date] 内该站点的 (逐小时值 float32，缺测为 NaN；是否插补 bool)。
+        只要有一天尚未与数据库对齐就返回 None。
+        revision 为后端 crud.data_revision 算出的 "天数.版本和"：给定时，存储中记录的版本必须与之完全一致，
+        否则说明数据库已有更新的写入而存储尚未同步，同样返回 None。
+        """
+        value_parts, filled_parts = [], []
+        revised_days = revision_sum = 0
+        for year, first_day, last_day in year_spans(start_date, end_date):
+            values_path, coverage_path, filled_path, revisions_path = self.shard_paths(source, pollutant_id, year)
+            days = year_hours(year) // 24
+            coverage = self._open_reader(coverage_path, np.uint8, days)
+            values = self._open_reader(values_path, np.float32, year_hours(year))
+            filled = self._open_reader(filled_path, np.uint8, year_hours(year))
+            revisions = self._open_reader(revisions_path, np.int64, days)
+            if (coverage is None or values is None or filled is None or revisions is None
+                    or not coverage[0, first_day:last_day + 1].all()):
+                return None
+            hours = slice(first_day * 24, (last_day + 1) * 24)
+            if site_id < min(values.shape[0], filled.shape[0], revisions.shape[0]):
+                site_revisions = revisions[site_id, first_day:last_day + 1]
+                revised_days += int(np.count_nonzero(site_revisions))
+                revision_sum += int(site_revisions.sum())
+                value_parts.append(values[site_id, hours])
+                filled_parts.append(filled[site_id, hours].astype(bool))
+            else:
+                # 已对齐但没有该站点的行：说明数据库里这段时间该站点没有数据
+                value_parts.append(np.full(hours.stop - hours.start, np.nan, dtype=np.float32))
+                filled_parts.append(np.zeros(hours.stop - hours.start, dtype=bool))
+        if revision is not None and f"{revised_days}.{revision_sum}" != revision:
+            return None
+        if len(value_parts) == 1:
+            return value_parts[0], filled_parts[0]
+        return np.concatenate(value_parts), np.concatenate(filled_parts)
+
+    # ---------- 写入 ----------
+    def _ensure_shard(self, source, pollutant_id, year, min_rows):
+        """创建分片或把站点行扩容到至少 min_rows 行；扩容只在文件末尾追加 NaN（插补标记、版本为 0）行。"""
+        values_path, coverage_path, filled_path, revisions_path = self.shard_paths(source, pollutant_id, year)
+        os.makedirs(os.path.dirname(values_path), exist_ok=True)
+        days = year_hours(year) // 24
+        try:
+            with open(coverage_path, 'xb') as f:
+                f.write(bytes(days))
+        except FileExistsError:
+            pass
+        if os.path.exists(values_path) and not (os.path.exists(filled_path) and os.path.exists(revisions_path)):
+            # 旧版本存储没有插补标记或版本：已覆盖的天全部作废，读取方回退到 SQL，直到重新同步
+            coverage = np.memmap(coverage_path, dtype=np.uint8, mode='r+')
+            coverage[:] = 0
+            coverage.flush()
+            del coverage
+
+        hours = year_hours(year)
+        rows = os.path.getsize(values_path) // (hours * 4) if os.path.exists(values_path) else 0
+        filled_rows = os.path.getsize(filled_path) // hours if os.path.exists(filled_path) else 0
+        revision_rows = os.path.getsize(revisions_path) // (days * 8) if os.path.exists(revisions_path) else 0
+        target = max(rows, -(-min_rows // SITE_ROW_CHUNK) * SITE_ROW_CHUNK)
+        if rows < target:
+            with open(values_path, 'ab') as f:
+                f.write(np.full((target - rows) * hours, np.nan, dtype=np.float32).tobytes())
+        if filled_rows < target:
+            with open(filled_path, 'ab') as f:
+                f.write(bytes((target - filled_rows) * hours))
+        if revision_rows < target:
+            with open(revisions_path, 'ab') as f:
+                f.write(bytes((target - revision_rows) * days * 8))
+        return values_path, coverage_path, filled_path, revisions_path, target
+
+    def write_days(self, source, pollutant_id, first_day, last_day, rows, revisions=()):
+        """
+        用数据库中 [first_day, last_day] 的全部记录 rows = [(site_id, date, hour, value, is_filled)]
+        与数据版本 revisions = [(site_id, date, revision)] 覆盖这些天的所有站点行，再把这些天标记为已对齐。
+        """
+        rows = list(rows)
+        revisions = list(revisions)
+        for year, first, last in year_spans(first_day, last_day):
+            year_rows = [row for row in rows if row[1].year == year]
+            year_revisions = [row for row in revisions if row[1].year == year]
+            min_rows = max((row[0] for row in year_rows + year_revisions), default=-1) + 1
+            values_path, coverage_path, filled_path, revisions_path, n_rows = self._ensure_shard(
+                source, pollutant_id, year, min_rows
+            )
+
+            block = np.full((n_rows, (last - first + 1) * 24), np.nan, dtype=np.float32)
+            filled_block = np.zeros(block.shape, dtype=np.uint8)
+            if year_rows:
+                sites, dates, hours, values, flags = zip(*year_rows)
+                origin = date(year, 1, 1).toordinal() + first
+                offsets = np.fromiter((d.toordinal() - origin for d in dates), dtype=np.int64, count=len(dates))
+                cells = (np.asarray(sites), offsets * 24 + np.asarray(hours))
+                block[cells] = np.asarray(values, dtype=np.float32)
+                filled_block[cells] = np.asarray(flags, dtype=np.uint8)
+
+            values = np.memmap(values_path, dtype=np.float32, mode='r+', shape=(n_rows, year_hours(year)))
+            values[:, first * 24:(last + 1) * 24] = block
+            values.flush()
+            del values
+
+            filled = np.memmap(filled_path, dtype=np.uint8, mode='r+', shape=(n_rows, year_hours(year)))
+            filled[:, first * 24:(last + 1) * 24] = filled_block
+            filled.flush()
+            del filled
+
+            revision_block = np.zeros((n_rows, last - first + 1), dtype=np.int64)
+            if year_revisions:
+                sites, dates, values = zip(*year_revisions)
+                origin = date(year, 1, 1).toordinal() + first
+                offsets = np.fromiter((d.toordinal() - origin for d in dates), dtype=np.int64, count=len(dates))
+                revision_block[np.asarray(sites), offsets] = np.asarray(values, dtype=np.int64)
+            day_revisions = np.memmap(revisions_path, dtype=np.int64, mode='r+', shape=(n_rows, year_hours(year) // 24))
+            day_revisions[:, first:last + 1] = revision_block
+            day_revisions.flush()
+            del day_revisions
+
+            coverage = np.memmap(coverage_path, dtype=np.uint8, mode='r+')
+            coverage[first:last + 1] = 1
+            coverage.flush()
+            del coverage
+
+    def sync_days(self, conn, source, pollutant_id, first_day, last_day):
+        """从数据库重新读取一个污染物在 [first_day, last_day] 内的全部记录与数据版本并写入存储。"""
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (SYNC_LOCK_ID,))
+            try:
+                # 先读版本再读数据（READ COMMITTED 下各自取快照）：记录的版本只可能比数据旧，不会比数据新
+                cur.execute("""
+                    SELECT site_id, date, revision
+                    FROM data_versions
+                    WHERE pollutant_id = %s AND date BETWEEN %s AND %s
+                """, (pollutant_id, first_day, last_day))
+                revisions = cur.fetchall()
+                cur.execute(f"""
+                    SELECT site_id, date, hour, value, is_filled
+                    FROM {SOURCE_TABLES[source]}
+                    WHERE pollutant_id = %s AND date BETWEEN %s AND %s AND value IS NOT NULL
+                """, (pollutant_id, first_day, last_day))
+                rows = cur.fetchall()
+                self.write_days(source, pollutant_id, first_day, last_day, rows, revisions)
+            finally:
+                # 先结束只读事务（出错时事务已中止），再释放会话级锁，避免连接停留在 idle in transaction
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (SYNC_LOCK_ID,))
+                conn.commit()
+        return len(rows)
+
+    def invalidate_days(self, source, pollutant_id, first_day, last_day):
+        """取消 [first_day, last_day] 的覆盖标记，读取方对这些天回退到 SQL，直到下次同步成功。"""
+        for year, first, last in year_spans(first_day, last_day):
+            _, coverage_path, _, _ = self.shard_paths(source, pollutant_id, year)
+            if not os.path.exists(coverage_path):
+                continue
+            coverage = np.memmap(coverage_path, dtype=np.uint8, mode='r+')
+            coverage[first:last + 1] = 0
+            coverage.flush()
+            del coverage
+
+    def sync_keys(self, conn, sources, keys):
+        """
+        导入后调用：keys 为本次写入涉及的 (pollutant_id, 日期)，按污染物合并成连续区间后同步 sources 中的数据源。
+        """
+        for pollutant_id, days in days_by_pollutant(keys).items():
+            for source in sources:
+                self.sync_days(conn, source, pollutant_id, min(days), max(days))
+
+    def invalidate_keys(self, sources, keys):
+        for pollutant_id, days in days_by_pollutant(keys).items():
+            for source in sources:
+                self.invalidate_days(source, pollutant_id, min(days), max(days))
+
+
+def get_store():
+    return SeriesStore(SERIES_STORE_PATH) if SERIES_STORE_PATH else None
+
+
+def sync_after_import(conn, source, keys):
+    """
+    导入脚本在提交后调用。存储只是读缓存，同步失败不影响导入本身：
+    失败时取消这些天的覆盖标记，后端对它们回退到 SQL，不会继续提供旧值；
+    之后再次导入这些天，或运行 python seriesStore.py 全量重建即可恢复。
+    source 的数据发生了变化，但 data_versions 由两个数据源共用，另一数据源记录的版本也随之过期，
+    因此两个数据源的这些天都要重新同步。
+    """
+    store = get_store()
+    if store is None or not keys:
+        return
+    try:
+        store.sync_keys(conn, sorted(SOURCE_TABLES), keys)
+    except Exception as e:
+        print(f"⚠️ 导入 {source} 数据后同步时间序列存储失败（不影响数据库导入）: {type(e).__name__}: {e}")
+        try:
+            store.invalidate_keys(sorted(SOURCE_TABLES), keys)
+            print("   已取消这些天的存储覆盖标记，查询将回退到数据库。")
+        except Exception as invalidate_error:
+            print(f"❌ 取消存储覆盖标记也失败，请运行 python seriesStore.py 重建: "
+                  f"{type(invalidate_error).__name__}: {invalidate_error}")
+
+
+def rebuild(conn, store, sources):
+    """按 (数据源, 污染物, 年) 逐片从数据库全量重建存储。"""
+    for source in sources:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT pollutant_id, MIN(date), MAX(date) FROM {SOURCE_TABLES[source]} GROUP BY pollutant_id")
+            ranges = cur.fetchall()
+        for pollutant_id, first_day, last_day in ranges:
+            for year in range(first_day.year, last_day.year + 1):
+                # 整年对齐，包括数据库中没有记录的日子
+                rows = store.sync_days(conn, source, pollutant_id, date(year, 1, 1), date(year, 12, 31))
+                print(f"  ✅ {source} 污染物 {pollutant_id} {year} 年: {rows} 条记录")
+
+
+def main():
+    from importMeasurements import get_db_connection
+
+    parser = argparse.ArgumentParser(description="从数据库重建内存映射时间序列存储")
+    parser.add_argument('--source', choices=sorted(SOURCE_TABLES), action='append',
+                        help="只重建指定数据源，可重复；默认全部")
+    args = parser.parse_args()
+
+    store = get_store()
+    if store is None:
+        print("❌ SERIES_STORE_PATH 未配置。")
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        rebuild(conn, store, args.source or sorted(SOURCE_TABLES))
+        print(f"🎉 时间序列存储已重建: {os.path.abspath(store.root)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# tools/ 下的脚本按模块名互相导入（import config、from seriesStore import ...），测试时同样把该目录放进 sys.path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from calibrateTif import solve_coefficients
+
+
+def sufficient_stats(x, y):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return [x.size, x.sum(), y.sum(), (x * x).sum(), (x * y).sum()]
+
+
+def test_recovers_exact_line():
+    x = np.array([10.0, 20.0, 35.0, 50.0])
+    slope, intercept = solve_coefficients([sufficient_stats(x, 1.5 * x - 4.0)])
+    assert slope[0] == pytest.approx(1.5)
+    assert intercept[0] == pytest.approx(-4.0)
+
+
+def test_matches_polyfit_for_each_row():
+    rng = np.random.default_rng(0)
+    rows, expected = [], []
+    for _ in range(3):
+        x = rng.uniform(0, 100, 50)
+        y = rng.uniform(0.5, 1.5) * x + rng.normal(0, 5, 50)
+        rows.append(sufficient_stats(x, y))
+        expected.append(np.polyfit(x, y, 1))
+    slope, intercept = solve_coefficients(rows)
+    assert np.column_stack([slope, intercept]) == pytest.approx(np.array(expected))
+
+
+def test_incremental_stats_equal_one_shot_fit():
+    x = np.arange(1.0, 21.0)
+    y = 0.8 * x + 3.0 + np.sin(x)
+    merged = np.add(sufficient_stats(x[:8], y[:8]), sufficient_stats(x[8:], y[8:]))
+    assert np.allclose(solve_coefficients([merged]), solve_coefficients([sufficient_stats(x, y)]))
+
+
+def test_degenerate_rows_fall_back_to_identity():
+    rows = [
+        [0, 0, 0, 0, 0],
+        sufficient_stats([5.0], [7.0]),
+        sufficient_stats([3.0, 3.0, 3.0], [1.0, 2.0, 4.0]),
+    ]
+    slope, intercept = solve_coefficients(rows)
+    assert slope.tolist() == [1.0, 1.0, 1.0]
+    assert intercept.tolist() == [0.0, 0.0, 0.0]
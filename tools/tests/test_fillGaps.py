@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from fillGaps import interpolate_gaps
+
+NAN = np.nan
+
+
+def test_interpolates_internal_gap_linearly():
+    filled, mask = interpolate_gaps([[10.0, NAN, NAN, 40.0]], max_gap=3)
+    assert filled[0].tolist() == pytest.approx([10.0, 20.0, 30.0, 40.0])
+    assert mask[0].tolist() == [False, True, True, False]
+
+
+def test_leaves_edges_and_long_gaps_missing():
+    grid = [
+        [NAN, 1.0, 2.0, NAN],
+        [0.0, NAN, NAN, NAN],
+    ]
+    filled, mask = interpolate_gaps(np.array(grid), max_gap=2)
+    # 首尾缺口缺少一侧实测值，不插补
+    assert np.isnan(filled[0, 0]) and np.isnan(filled[0, 3])
+    # 第二行缺口延伸到末尾，同样不插补
+    assert np.isnan(filled[1, 1:]).all()
+    assert not mask.any()
+
+
+def test_respects_max_gap_per_row():
+    grid = np.array(
+        [
+            [0.0, NAN, NAN, NAN, 8.0],
+            [0.0, NAN, 4.0, NAN, 8.0],
+        ]
+    )
+    filled, mask = interpolate_gaps(grid, max_gap=2)
+    assert np.isnan(filled[0, 1:4]).all()
+    assert filled[1].tolist() == pytest.approx([0.0, 2.0, 4.0, 6.0, 8.0])
+    assert mask.tolist() == [[False] * 5, [False, True, False, True, False]]
+
+
+def test_does_not_modify_input():
+    grid = np.array([[1.0, NAN, 3.0]])
+    interpolate_gaps(grid, max_gap=1)
+    assert np.isnan(grid[0, 1])
+
+
+def test_station_gap_records_skip_filled_rows_and_old_days():
+    from datetime import date
+
+    from fillGaps import station_gap_records
+
+    day1, day2 = date(2024, 9, 23), date(2024, 9, 24)
+    rows = [
+        # 第一天 22 点与第二天 1 点之间缺两个小时，跨越 scan_from
+        (1, day1, 21, 5.0, False),
+        (1, day1, 22, 6.0, False),
+        (1, day2, 1, 9.0, False),
+        # 插补值不作锚点：站点 2 的 3 点只有插补值，1 点已插补过不再生成
+        (2, day2, 0, 0.0, False),
+        (2, day2, 1, 1.0, True),
+        (2, day2, 2, 2.0, False),
+        (2, day2, 3, 3.0, True),
+    ]
+    records = station_gap_records(rows, day1, day2, scan_from=day2, max_gap=3)
+    assert [record[:3] for record in records] == [(1, day2, 0)]
+    assert records[0][3] == pytest.approx(8.0)